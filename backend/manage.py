@@ -0,0 +1,59 @@
+import asyncio
+from typing import Optional
+
+import typer
+
+from server import assign_expense_years, backfill_image_thumbnails, client, migrate_created_at, migrate_inline_images, reconcile_ledgers
+
+cli = typer.Typer(help="Maintenance commands for the Aportes backend")
+
+def run(coroutine):
+    try:
+        return asyncio.run(coroutine)
+    finally:
+        client.close()
+
+@cli.command("migrate-images")
+def migrate_images():
+    """Move inline base64 receipt and activity images into the image store."""
+    migrated = run(migrate_inline_images())
+    for collection_name, count in migrated.items():
+        typer.echo(f"{collection_name}: {count} images migrated")
+
+@cli.command("generate-thumbnails")
+def generate_thumbnails():
+    """Render image variants and set thumbnail references on existing documents."""
+    backfilled = run(backfill_image_thumbnails())
+    for collection_name, count in backfilled.items():
+        typer.echo(f"{collection_name}: {count} thumbnails generated")
+
+@cli.command("migrate-dates")
+def migrate_dates(batch_size: int = typer.Option(1000, help="Documents converted per bulk write")):
+    """Convert ISO string created_at values to native BSON datetimes."""
+    migrated = run(migrate_created_at(batch_size))
+    for collection_name, count in migrated.items():
+        typer.echo(f"{collection_name}: {count} dates migrated")
+
+@cli.command("assign-expense-years")
+def assign_expense_years_command():
+    """Set the academic year on expenses recorded before expenses carried one."""
+    assigned = run(assign_expense_years())
+    for tesorero_id, count in assigned.items():
+        typer.echo(f"{tesorero_id}: {count} expenses assigned")
+
+@cli.command("reconcile-ledger")
+def reconcile_ledger(
+    tesorero_id: Optional[str] = typer.Option(None, help="Only reconcile this tesorero"),
+    dry_run: bool = typer.Option(False, help="Report drift without rewriting ledgers"),
+):
+    """Rebuild ledger totals from payments, expenses and students, reporting drift."""
+    drifted = run(reconcile_ledgers(tesorero_id, dry_run=dry_run))
+    if not drifted:
+        typer.echo("No drift found")
+    for drifted_id, drift in drifted.items():
+        typer.echo(f"{drifted_id}:")
+        for field, values in drift.items():
+            typer.echo(f"  {field}: stored={values['stored']} actual={values['actual']}")
+
+if __name__ == "__main__":
+    cli()
@@ -1,29 +1,243 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Request, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import ASCENDING, IndexModel, InsertOne, ReturnDocument, UpdateOne, monitoring
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter, field_validator
 from typing import List, Optional
 import uuid
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
 import hashlib
 import jwt
 import base64
+import re
+import json
+import time
+import contextvars
+import csv
+import shutil
+import tempfile
+import anyio
+import asyncio
+import io
+import multiprocessing
+import zipfile
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+from PIL import Image, ImageOps
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from passlib.context import CryptContext
+from collections import OrderedDict
+from functools import lru_cache
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# Request instrumentation: the Mongo commands issued while serving a request are
+# collected through a command listener into a per-request trace
+REQUEST_TRACE = contextvars.ContextVar("request_trace", default=None)
+
+class RequestTrace:
+    def __init__(self):
+        self.started = {}
+        self.commands = []
+
+    @property
+    def mongo_seconds(self) -> float:
+        return sum(duration for _, duration in self.commands)
+
+class MongoCommandListener(monitoring.CommandListener):
+    # Motor copies the request context into its executor threads, so the trace is visible here
+    def started(self, event):
+        trace = REQUEST_TRACE.get()
+        if trace is None:
+            return
+        target = event.command.get(event.command_name)
+        if not isinstance(target, str):
+            target = event.command.get("collection", "")
+        trace.started[event.request_id] = f"{event.command_name} {target}".strip()
+
+    def succeeded(self, event):
+        self.finished(event)
+
+    def failed(self, event):
+        self.finished(event)
+
+    def finished(self, event):
+        trace = REQUEST_TRACE.get()
+        if trace is None:
+            return
+        description = trace.started.pop(event.request_id, event.command_name)
+        trace.commands.append((description, event.duration_micros / 1_000_000))
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels: tuple, value: float):
+        series = self.series.setdefault(labels, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                series["buckets"][position] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self.series.items()):
+            label_text = ",".join(f'{name}="{prometheus_escape(value)}"' for name, value in zip(self.label_names, labels))
+            for bound, count in zip(self.buckets, series["buckets"]):
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {series["count"]}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {series['sum']}")
+            lines.append(f"{self.name}_count{{{label_text}}} {series['count']}")
+        return lines
+
+def prometheus_escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+REQUEST_LABELS = ("method", "route", "status")
+request_duration = Histogram(
+    "http_request_duration_seconds", "Request latency", REQUEST_LABELS,
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+request_mongo_commands = Histogram(
+    "http_request_mongo_commands", "Mongo round-trips per request", REQUEST_LABELS,
+    (0, 1, 2, 3, 5, 8, 13, 21, 50)
+)
+request_mongo_duration = Histogram(
+    "http_request_mongo_seconds", "Time spent in Mongo per request", REQUEST_LABELS,
+    (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+response_size = Histogram(
+    "http_response_size_bytes", "Response body size", REQUEST_LABELS,
+    (256, 1024, 10_240, 102_400, 1_048_576, 10_485_760)
+)
+# Streaming responses stay open for as long as the client reads, so their duration is
+# kept out of the latency histogram and the slow request log
+STREAMING_ROUTES = {"/api/events", "/api/reports/export"}
+stream_duration = Histogram(
+    "http_stream_duration_seconds", "Streaming response duration", REQUEST_LABELS,
+    (1, 10, 60, 300, 1800, 3600, 14400)
+)
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_MS', '1000')) / 1000
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        trace = RequestTrace()
+        token = REQUEST_TRACE.set(trace)
+        started_at = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_with_metrics(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            REQUEST_TRACE.reset(token)
+            record_request(scope, status, size, time.perf_counter() - started_at, trace)
+
+def record_request(scope, status: int, size: int, duration: float, trace: RequestTrace):
+    # Label by route template, never the raw path, to keep the series count bounded
+    route = scope.get("route")
+    labels = (scope["method"], route.path if route else "unmatched", str(status))
+    request_mongo_commands.observe(labels, len(trace.commands))
+    request_mongo_duration.observe(labels, trace.mongo_seconds)
+    response_size.observe(labels, size)
+    if labels[1] in STREAMING_ROUTES:
+        stream_duration.observe(labels, duration)
+        return
+    request_duration.observe(labels, duration)
+    if duration >= SLOW_REQUEST_SECONDS:
+        queries = ", ".join(f"{description} ({command_duration * 1000:.1f}ms)" for description, command_duration in trace.commands)
+        logger.warning(
+            f"Slow request {scope['method']} {scope['path']} -> {status} in {duration * 1000:.0f}ms, "
+            f"{len(trace.commands)} Mongo commands ({trace.mongo_seconds * 1000:.1f}ms): {queries or 'none'}"
+        )
+
+# MongoDB connection. Pool size, timeouts and wire compression come from the environment;
+# an unset variable leaves the driver default (or the option given in MONGO_URL)
+MONGO_CLIENT_OPTIONS = {
+    "maxPoolSize": ("MONGO_MAX_POOL_SIZE", int),
+    "minPoolSize": ("MONGO_MIN_POOL_SIZE", int),
+    "maxIdleTimeMS": ("MONGO_MAX_IDLE_TIME_MS", int),
+    "waitQueueTimeoutMS": ("MONGO_WAIT_QUEUE_TIMEOUT_MS", int),
+    "connectTimeoutMS": ("MONGO_CONNECT_TIMEOUT_MS", int),
+    "socketTimeoutMS": ("MONGO_SOCKET_TIMEOUT_MS", int),
+    "serverSelectionTimeoutMS": ("MONGO_SERVER_SELECTION_TIMEOUT_MS", int),
+    "compressors": ("MONGO_COMPRESSORS", str),
+}
+
+def mongo_client_options() -> dict:
+    options = {}
+    for option, (variable, convert) in MONGO_CLIENT_OPTIONS.items():
+        value = os.environ.get(variable)
+        if value:
+            options[option] = convert(value)
+    return options
+
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, event_listeners=[MongoCommandListener()], **mongo_client_options())
 db = client[os.environ['DB_NAME']]
 
+# Read-heavy routes that tolerate bounded staleness read through their own handle, so
+# on a replica set they can be served by secondaries instead of the primary
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+MONGO_MAX_STALENESS_SECONDS = int(os.environ.get('MONGO_MAX_STALENESS_SECONDS', '90'))
+
+def routed_database(variable: str):
+    mode = os.environ.get(variable, 'secondaryPreferred')
+    if mode not in READ_PREFERENCES:
+        raise RuntimeError(f"Unknown read preference in {variable}: {mode}")
+    if mode == "primary":
+        read_preference = Primary()
+    else:
+        read_preference = READ_PREFERENCES[mode](max_staleness=MONGO_MAX_STALENESS_SECONDS)
+    return client.get_database(os.environ['DB_NAME'], read_preference=read_preference)
+
+public_db = routed_database('MONGO_PUBLIC_READ_PREFERENCE')
+report_db = routed_database('MONGO_REPORT_READ_PREFERENCE')
+
+# Opt-in fast serialization: orjson responses, and list routes that validate
+# database rows once and serialize them without FastAPI re-validating the output
+FAST_JSON = os.environ.get('FAST_JSON', 'false').lower() in ('1', 'true', 'yes')
+
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse if FAST_JSON else JSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -66,12 +280,23 @@ class StudentCreate(BaseModel):
     name: str
     cedula: str
 
+class StudentImportRejection(BaseModel):
+    row: int
+    cedula: Optional[str] = None
+    reason: str
+
+class StudentImportResult(BaseModel):
+    imported: int
+    rejected: List[StudentImportRejection]
+
 class PaymentSettings(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     tesorero_id: str
     monthly_amount: float
     selected_months: List[str]
     academic_year: str
+    active: bool = True
+    closed_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class PaymentSettingsCreate(BaseModel):
@@ -79,6 +304,11 @@ class PaymentSettingsCreate(BaseModel):
     selected_months: List[str]
     academic_year: str
 
+class AcademicYearCloseResult(BaseModel):
+    academic_year: str
+    payments_archived: int
+    expenses_archived: int
+
 class MonthlyPayment(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     student_id: str
@@ -87,8 +317,12 @@ class MonthlyPayment(BaseModel):
     paid: bool = False
     amount: float
     receipt_image: Optional[str] = None
+    receipt_thumbnail: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class MonthlyPaymentListItem(MonthlyPayment):
+    has_receipt_image: bool = False
+
 class PaymentCreate(BaseModel):
     student_id: str
     month: str
@@ -96,15 +330,56 @@ class PaymentCreate(BaseModel):
     amount: float
     receipt_image: Optional[str] = None
 
+    @field_validator("month", "year")
+    @classmethod
+    def validate_ledger_key(cls, value: str) -> str:
+        # Month and year become ledger field names, which cannot hold '.' or start with '$'
+        if not value or "." in value or value.startswith("$"):
+            raise ValueError("must not be empty, contain '.' or start with '$'")
+        return value
+
+class PaymentMatrixCell(BaseModel):
+    month: str
+    paid: bool = False
+    amount: Optional[float] = None
+    payment_id: Optional[str] = None
+    has_receipt_image: bool = False
+    receipt_thumbnail: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+class PaymentMatrixRow(BaseModel):
+    student: Student
+    cells: List[PaymentMatrixCell]
+    total_paid: float
+
+class PaymentMatrix(BaseModel):
+    year: str
+    months: List[str]
+    settings: Optional[PaymentSettings] = None
+    rows: List[PaymentMatrixRow]
+    total_paid: float
+    paid_count: int
+
+class BulkPaymentResult(BaseModel):
+    index: int
+    status: str
+    payment: Optional[MonthlyPayment] = None
+    detail: Optional[str] = None
+
 class Expense(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     tesorero_id: str
-    responsible_student_id: str
+    responsible_student_id: Optional[str] = None
     description: str
     amount: float
     activity_image: Optional[str] = None
+    activity_thumbnail: Optional[str] = None
+    academic_year: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class ExpenseListItem(Expense):
+    has_activity_image: bool = False
+
 class ExpenseCreate(BaseModel):
     responsible_student_id: str
     description: str
@@ -124,36 +399,595 @@ class PublicStudentInfo(BaseModel):
     payments: List[MonthlyPayment]
     total_paid: float
 
+# Image blob store: images are stored once, keyed by the SHA-256 of their content,
+# and documents keep only that digest as a reference
+IMAGE_DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+IMAGE_CHUNK_SIZE = 256 * 1024
+IMAGE_MAX_BYTES = int(os.environ.get('IMAGE_MAX_BYTES', str(10 * 1024 * 1024)))
+# Images are uploaded when picked and referenced when the form is submitted; the purge
+# keeps anything uploaded within this window even if nothing references it yet
+IMAGE_UPLOAD_GRACE_SECONDS = int(os.environ.get('IMAGE_UPLOAD_GRACE_SECONDS', '3600'))
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+def detect_image_type(head: bytes) -> Optional[str]:
+    for signature, content_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    return None
+
+class StoredImage:
+    def __init__(self, digest: str, content_type: str, length: int, chunks):
+        self.digest = digest
+        self.content_type = content_type
+        self.length = length
+        self.chunks = chunks
+
+class GridFSImageStore:
+    def __init__(self, database, bucket_name: str = "images"):
+        self.bucket = AsyncIOMotorGridFSBucket(database, bucket_name=bucket_name)
+        self.files = database[f"{bucket_name}.files"]
+
+    async def exists(self, digest: str) -> bool:
+        return await self.files.find_one({"filename": digest}, {"_id": 1}) is not None
+
+    async def put(self, digest: str, content: bytes, content_type: str):
+        if await self.exists(digest):
+            return
+        await self.bucket.upload_from_stream(
+            digest, content, chunk_size_bytes=IMAGE_CHUNK_SIZE, metadata={"contentType": content_type}
+        )
+
+    async def put_file(self, digest: str, source: Path, content_type: str):
+        if await self.exists(digest):
+            return
+        # The driver reads the file chunk by chunk on its executor thread
+        with open(source, "rb") as f:
+            await self.bucket.upload_from_stream(
+                digest, f, chunk_size_bytes=IMAGE_CHUNK_SIZE, metadata={"contentType": content_type}
+            )
+
+    async def get(self, digest: str) -> Optional[StoredImage]:
+        file_doc = await self.files.find_one({"filename": digest})
+        if not file_doc:
+            return None
+        grid_out = await self.bucket.open_download_stream(file_doc["_id"])
+
+        async def chunks():
+            while True:
+                chunk = await grid_out.readchunk()
+                if not chunk:
+                    break
+                yield chunk
+
+        content_type = (file_doc.get("metadata") or {}).get("contentType", "application/octet-stream")
+        return StoredImage(digest, content_type, file_doc["length"], chunks())
+
+    async def delete(self, digest: str):
+        async for file_doc in self.files.find({"filename": digest}, {"_id": 1}):
+            await self.bucket.delete(file_doc["_id"])
+
+class FileSystemImageStore:
+    def __init__(self, root: Path):
+        self.root = root
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    async def exists(self, digest: str) -> bool:
+        return await anyio.Path(self.path_for(digest)).exists()
+
+    async def put(self, digest: str, content: bytes, content_type: str):
+        path = anyio.Path(self.path_for(digest))
+        if await path.exists():
+            return
+        await path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary name first so readers never see a partial image
+        temp_path = path.with_name(f"{digest}.{uuid.uuid4().hex}.tmp")
+        await temp_path.write_bytes(content)
+        await temp_path.rename(path)
+
+    async def put_file(self, digest: str, source: Path, content_type: str):
+        path = anyio.Path(self.path_for(digest))
+        if await path.exists():
+            return
+        await path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{digest}.{uuid.uuid4().hex}.tmp")
+        await run_in_threadpool(shutil.copyfile, source, temp_path)
+        await temp_path.rename(path)
+
+    async def get(self, digest: str) -> Optional[StoredImage]:
+        path = anyio.Path(self.path_for(digest))
+        if not await path.exists():
+            return None
+        length = (await path.stat()).st_size
+        async with await anyio.open_file(path, "rb") as f:
+            head = await f.read(16)
+        content_type = detect_image_type(head) or "application/octet-stream"
+
+        async def chunks():
+            async with await anyio.open_file(path, "rb") as f:
+                while True:
+                    chunk = await f.read(IMAGE_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+
+        return StoredImage(digest, content_type, length, chunks())
+
+    async def delete(self, digest: str):
+        path = anyio.Path(self.path_for(digest))
+        if await path.exists():
+            await path.unlink()
+
+def create_image_store():
+    backend = os.environ.get('IMAGE_STORE', 'gridfs')
+    if backend == 'gridfs':
+        return GridFSImageStore(db)
+    if backend == 'filesystem':
+        return FileSystemImageStore(ROOT_DIR / os.environ.get('IMAGE_STORE_PATH', 'images'))
+    raise RuntimeError(f"Unknown IMAGE_STORE backend: {backend}")
+
+image_store = create_image_store()
+
+async def store_image(content: bytes, content_type: str) -> str:
+    digest = hashlib.sha256(content).hexdigest()
+    await image_store.put(digest, content, content_type)
+    return digest
+
+async def resolve_image_reference(value: Optional[str]) -> Optional[str]:
+    # Accepts a digest, an /api/images/ URL or a legacy base64 data URL
+    if not value:
+        return None
+    if value.startswith("data:"):
+        try:
+            header, encoded = value.split(",", 1)
+            content = base64.b64decode(encoded, validate=True)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid image data")
+        content_type = detect_image_type(content[:16])
+        if not content_type:
+            raise HTTPException(status_code=400, detail="Invalid file type")
+        if len(content) > IMAGE_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Image exceeds {IMAGE_MAX_BYTES} bytes")
+        return await ingest_image(content, content_type)
+    digest = value.rsplit("/", 1)[-1]
+    if not IMAGE_DIGEST_PATTERN.match(digest) or not await image_store.exists(digest):
+        raise HTTPException(status_code=400, detail="Image not found")
+    return digest
+
+# Resized variants of every stored image, rendered in a process pool so image
+# decoding never runs on the event loop; each variant is itself a stored image
+IMAGE_VARIANTS = {
+    "thumbnail": (int(os.environ.get('THUMBNAIL_SIZE', '320')), 70),
+    "display": (int(os.environ.get('DISPLAY_SIZE', '1280')), 80),
+}
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', '2'))
+IMAGE_FIELDS = [
+    ("payments", "receipt_image", "receipt_thumbnail"), ("expenses", "activity_image", "activity_thumbnail"),
+    ("payments_archive", "receipt_image", "receipt_thumbnail"), ("expenses_archive", "activity_image", "activity_thumbnail"),
+]
+image_pool = None
+
+def get_image_pool() -> ProcessPoolExecutor:
+    global image_pool
+    if image_pool is None:
+        # By now Motor and the password pool run threads, which a forked worker would
+        # inherit mid-operation; forkserver workers start from a clean single-threaded process
+        image_pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("forkserver"))
+    return image_pool
+
+def render_image_variants(source, variants: dict) -> dict:
+    # Runs in a worker process: fit each variant in a size x size box as a JPEG
+    # The source is either the image bytes or the path of a file holding them
+    rendered = {}
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        for name, (size, quality) in variants.items():
+            variant = image.copy()
+            variant.thumbnail((size, size))
+            output = io.BytesIO()
+            variant.save(output, "JPEG", quality=quality, optimize=True, progressive=True)
+            rendered[name] = output.getvalue()
+    return rendered
+
+async def store_image_variants(digest: str, source) -> dict:
+    original_size = len(source) if isinstance(source, bytes) else source.stat().st_size
+    loop = asyncio.get_running_loop()
+    try:
+        rendered = await loop.run_in_executor(get_image_pool(), render_image_variants, source, IMAGE_VARIANTS)
+    except (OSError, Image.DecompressionBombError) as e:
+        logger.warning(f"Could not render variants of image {digest}: {e}")
+        rendered = {}
+    
+    # A variant that is not smaller than the original (or could not be rendered) points back to it
+    variants = {}
+    for name in IMAGE_VARIANTS:
+        variant = rendered.get(name)
+        variants[name] = await store_image(variant, "image/jpeg") if variant and len(variant) < original_size else digest
+    await db.image_variants.update_one(
+        {"digest": digest}, {"$set": {**variants, "uploaded_at": datetime.now(timezone.utc)}}, upsert=True
+    )
+    return {"digest": digest, **variants}
+
+async def mark_image_uploaded(digest: str) -> bool:
+    # Also stamps content that is already stored, so a purge running meanwhile leaves it alone
+    return await db.image_variants.find_one_and_update(
+        {"digest": digest}, {"$set": {"uploaded_at": datetime.now(timezone.utc)}}, projection={"_id": 1}
+    ) is not None
+
+async def ingest_image(content: bytes, content_type: str) -> str:
+    has_variants = await mark_image_uploaded(hashlib.sha256(content).hexdigest())
+    digest = await store_image(content, content_type)
+    if not has_variants:
+        await store_image_variants(digest, content)
+    return digest
+
+async def spool_upload(file: UploadFile):
+    # Copies an upload to a temporary file chunk by chunk while hashing it, so an
+    # upload is never held in memory whole; the type comes from the magic bytes
+    sha256 = hashlib.sha256()
+    size = 0
+    content_type = None
+    handle, temp_name = tempfile.mkstemp(prefix="upload_")
+    os.close(handle)
+    temp_path = Path(temp_name)
+    try:
+        async with await anyio.open_file(temp_path, "wb") as f:
+            while chunk := await file.read(IMAGE_CHUNK_SIZE):
+                if content_type is None:
+                    content_type = detect_image_type(chunk)
+                    if not content_type:
+                        raise HTTPException(status_code=400, detail="Invalid file type")
+                size += len(chunk)
+                if size > IMAGE_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Image exceeds {IMAGE_MAX_BYTES} bytes")
+                sha256.update(chunk)
+                await f.write(chunk)
+        if content_type is None:
+            raise HTTPException(status_code=400, detail="Empty file")
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return temp_path, sha256.hexdigest(), content_type
+
+async def ingest_upload(file: UploadFile) -> str:
+    temp_path, digest, content_type = await spool_upload(file)
+    try:
+        has_variants = await mark_image_uploaded(digest)
+        await image_store.put_file(digest, temp_path, content_type)
+        if not has_variants:
+            await store_image_variants(digest, temp_path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+    return digest
+
+async def get_image_variants(digest: Optional[str]) -> Optional[dict]:
+    # Variants are rendered on first use for images stored before they existed
+    if not digest:
+        return None
+    variants = await db.image_variants.find_one({"digest": digest}, {"_id": 0})
+    if variants:
+        return variants
+    image = await image_store.get(digest)
+    if not image:
+        return None
+    content = b"".join([chunk async for chunk in image.chunks])
+    return await store_image_variants(digest, content)
+
+async def image_thumbnail(digest: Optional[str]) -> Optional[str]:
+    variants = await get_image_variants(digest)
+    return variants["thumbnail"] if variants else None
+
+async def migrate_inline_images() -> dict:
+    # One-off move of legacy base64 data URLs out of payment/expense documents
+    migrated = {}
+    for collection_name, field, thumbnail_field in IMAGE_FIELDS:
+        collection = db[collection_name]
+        migrated[collection_name] = 0
+        async for item in collection.find({field: {"$regex": "^data:"}}, {"id": 1, field: 1}):
+            try:
+                digest = await resolve_image_reference(item[field])
+            except HTTPException:
+                logger.warning(f"Skipping unreadable image in {collection_name} {item['id']}")
+                continue
+            await collection.update_one(
+                {"id": item["id"]}, {"$set": {field: digest, thumbnail_field: await image_thumbnail(digest)}}
+            )
+            migrated[collection_name] += 1
+    return migrated
+
+async def backfill_image_thumbnails() -> dict:
+    # Thumbnail references for documents whose images were stored before variants existed
+    backfilled = {}
+    for collection_name, field, thumbnail_field in IMAGE_FIELDS:
+        collection = db[collection_name]
+        backfilled[collection_name] = 0
+        query = {field: {"$regex": "^[0-9a-f]{64}$"}, thumbnail_field: None}
+        async for item in collection.find(query, {"id": 1, field: 1}):
+            await collection.update_one(
+                {"id": item["id"]}, {"$set": {thumbnail_field: await image_thumbnail(item[field])}}
+            )
+            backfilled[collection_name] += 1
+    return backfilled
+
+# Projections that keep image references out of list queries unless requested
+def list_projection(fields: List[str], image_field: str, include_images: bool) -> dict:
+    projection = {"_id": 0, **{field: 1 for field in fields}}
+    projection[f"has_{image_field}"] = {"$ne": [{"$ifNull": [f"${image_field}", None]}, None]}
+    if include_images:
+        projection[image_field] = 1
+    return projection
+
+PAYMENT_LIST_FIELDS = ["id", "student_id", "month", "year", "paid", "amount", "receipt_thumbnail", "created_at"]
+EXPENSE_LIST_FIELDS = ["id", "tesorero_id", "responsible_student_id", "description", "amount", "activity_thumbnail", "academic_year", "created_at"]
+
+# Keyset pagination over (created_at, id) for list endpoints
+LIST_SORT = [("created_at", ASCENDING), ("id", ASCENDING)]
+MAX_PAGE_SIZE = 1000
+
+async def keyset_query(collection, query: dict, after: Optional[str]) -> dict:
+    if not after:
+        return query
+    anchor = await collection.find_one({**query, "id": after}, {"_id": 0, "id": 1, "created_at": 1})
+    if not anchor:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    after_anchor = [
+        {"created_at": {"$gt": anchor["created_at"]}},
+        {"created_at": anchor["created_at"], "id": {"$gt": anchor["id"]}}
+    ]
+    if isinstance(anchor["created_at"], str):
+        # Unmigrated string dates sort before BSON dates, which $gt on a string never matches
+        after_anchor.append({"created_at": {"$type": "date"}})
+    return {"$and": [query, {"$or": after_anchor}]}
+
+async def list_response(cursor, model, response: Response, limit: Optional[int], stream: bool):
+    # NDJSON mode serializes documents as the cursor yields them
+    if stream:
+        async def lines():
+            async for item in cursor:
+                yield model(**parse_from_mongo(item)).model_dump_json() + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    
+    rows = await cursor.to_list(None)
+    if FAST_JSON:
+        # pydantic-core parses the stored ISO dates while validating the whole list in one pass
+        adapter = list_adapter(model)
+        items = adapter.validate_python(rows)
+        headers = {"X-Next-After": items[-1].id} if limit and len(items) == limit else None
+        return Response(content=adapter.dump_json(items), media_type="application/json", headers=headers)
+    
+    items = [model(**parse_from_mongo(item)) for item in rows]
+    if limit and len(items) == limit:
+        response.headers["X-Next-After"] = items[-1].id
+    return items
+
+@lru_cache(maxsize=None)
+def list_adapter(model) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+def model_response(payload: BaseModel):
+    # Already-validated models skip FastAPI's response_model pass on the fast path
+    if FAST_JSON:
+        return Response(content=payload.model_dump_json(), media_type="application/json")
+    return payload
+
+# In-process LRU cache whose entries expire after a TTL
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float, on_evict=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Called with (key, value) for entries dropped on expiry or to make room
+        self.on_evict = on_evict
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self.entries[key]
+                if self.on_evict:
+                    self.on_evict(key, entry[1])
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else min(ttl, self.ttl))
+        self.entries[key] = (expires_at, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            evicted_key, (_, evicted) = self.entries.popitem(last=False)
+            if self.on_evict:
+                self.on_evict(evicted_key, evicted)
+
+    def invalidate(self, key):
+        entry = self.entries.pop(key, None)
+        return entry[1] if entry else None
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
+
+# Authenticated users and already-verified tokens, so repeated requests skip the users lookup
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '1024'))
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', '60'))
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+token_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+# Response cache for the public endpoints. Entries are tagged with the tesorero whose
+# data they contain and dropped by the write routes; a backend only needs get/set/invalidate
+class InProcessResponseCache:
+    def __init__(self, maxsize: int, ttl: float):
+        # Entries carry their tags, so a key leaves the tag index when its entry is dropped
+        self.entries = TTLCache(maxsize, ttl, on_evict=self.untag)
+        self.tags = {}
+
+    def untag(self, key: str, entry):
+        for tag in entry[1]:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+    async def get(self, key: str):
+        entry = self.entries.get(key)
+        return entry[0] if entry else None
+
+    async def set(self, key: str, value, tags: List[str]):
+        self.entries.set(key, (value, tags))
+        for tag in tags:
+            self.tags.setdefault(tag, set()).add(key)
+
+    async def invalidate(self, tag: str):
+        for key in list(self.tags.get(tag, ())):
+            entry = self.entries.invalidate(key)
+            if entry:
+                self.untag(key, entry)
+        self.tags.pop(tag, None)
+
+    def stats(self) -> dict:
+        return self.entries.stats()
+
+# Each worker has its own cache, so the TTL bounds staleness across workers
+PUBLIC_CACHE_SIZE = int(os.environ.get('PUBLIC_CACHE_SIZE', '2048'))
+PUBLIC_CACHE_TTL = float(os.environ.get('PUBLIC_CACHE_TTL', '300'))
+public_cache = InProcessResponseCache(PUBLIC_CACHE_SIZE, PUBLIC_CACHE_TTL)
+
+# Public reads may be served by a secondary up to MONGO_MAX_STALENESS_SECONDS behind, so
+# for that long after a write a tesorero's public pages are rebuilt through the primary;
+# otherwise the entry rebuilt after the write could cache data from before it
+recent_public_writes = {}
+
+async def invalidate_public_cache(tesorero_id: str):
+    recent_public_writes[tesorero_id] = time.monotonic() + MONGO_MAX_STALENESS_SECONDS
+    await public_cache.invalidate(tesorero_id)
+
+def public_read_db(tesorero_id: str):
+    deadline = recent_public_writes.get(tesorero_id)
+    if deadline is None:
+        return public_db
+    if deadline > time.monotonic():
+        return db
+    del recent_public_writes[tesorero_id]
+    return public_db
+
+def any_recent_public_write() -> bool:
+    now = time.monotonic()
+    return any(deadline > now for deadline in recent_public_writes.values())
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match", "")
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return etag in candidates or "*" in candidates
+
+async def cached_public_response(request: Request, key: str, build):
+    # build() returns (payload, tesorero_id); payloads without an owner are not cached
+    entry = await public_cache.get(key)
+    if entry is None:
+        payload, tesorero_id = await build()
+        body = json.dumps(jsonable_encoder(payload)).encode()
+        entry = (body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+        if tesorero_id:
+            await public_cache.set(key, entry, [tesorero_id])
+    body, etag = entry
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def invalidate_cached_user(user_id: str):
+    # Called whenever a user document changes; tokens stay valid and resolve to the fresh user
+    user_cache.invalidate(user_id)
+
 # Helper functions
+# Passwords are hashed with PBKDF2-SHA256; legacy unsalted SHA-256 hex digests still
+# verify and are replaced on the next successful login, as are hashes with fewer rounds
+PASSWORD_HASH_ROUNDS = int(os.environ.get('PASSWORD_HASH_ROUNDS', '310000'))
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', '32'))
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256", "hex_sha256"],
+    deprecated=["hex_sha256"],
+    pbkdf2_sha256__rounds=PASSWORD_HASH_ROUNDS
+)
+
+# Key derivation runs on its own bounded pool, off the event loop and away from the
+# shared threadpool; beyond PASSWORD_HASH_QUEUE pending hashes new logins are turned away
+password_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password")
+password_tasks = 0
+
+async def run_password_task(function, *args):
+    global password_tasks
+    if password_tasks >= PASSWORD_HASH_QUEUE:
+        raise HTTPException(status_code=503, detail="Too many login attempts, try again", headers={"Retry-After": "1"})
+    password_tasks += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_pool, function, *args)
+    finally:
+        password_tasks -= 1
+
 def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+    return pwd_context.hash(password)
 
-def verify_password(password: str, hashed_password: str) -> bool:
-    return hash_password(password) == hashed_password
+def verify_password(password: str, hashed_password: Optional[str]):
+    # Returns (valid, replacement hash or None); a missing user still pays for one hash
+    if not hashed_password:
+        pwd_context.dummy_verify()
+        return False, None
+    return pwd_context.verify_and_update(password, hashed_password)
 
 def create_jwt_token(user_id: str) -> str:
     payload = {"user_id": user_id, "exp": datetime.now(timezone.utc).timestamp() + 86400}  # 24 hours
     return jwt.encode(payload, JWT_SECRET, algorithm="HS256")
 
 def decode_jwt_token(token: str) -> str:
+    user_id = token_cache.get(token)
+    if user_id:
+        return user_id
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        return payload["user_id"]
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    # Never cache a verified token past its own expiry
+    token_cache.set(token, payload["user_id"], ttl=payload["exp"] - datetime.now(timezone.utc).timestamp())
+    return payload["user_id"]
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    user_id = decode_jwt_token(credentials.credentials)
-    user = await db.users.find_one({"id": user_id})
+    return await user_for_token(credentials.credentials)
+
+async def user_for_token(token: str) -> UserResponse:
+    user_id = decode_jwt_token(token)
+    cached_user = user_cache.get(user_id)
+    if cached_user:
+        return cached_user
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
-    return UserResponse(**user)
+    user_response = UserResponse(**parse_from_mongo(user))
+    user_cache.set(user_id, user_response)
+    return user_response
 
+# created_at is stored as a native BSON datetime; rows written before the
+# migration may still hold ISO strings, so both forms are accepted
 def prepare_for_mongo(data):
-    if isinstance(data.get('created_at'), datetime):
-        data['created_at'] = data['created_at'].isoformat()
+    if isinstance(data.get('created_at'), str):
+        data['created_at'] = datetime.fromisoformat(data['created_at'])
     return data
 
 def parse_from_mongo(item):
@@ -161,6 +995,272 @@ def parse_from_mongo(item):
         item['created_at'] = datetime.fromisoformat(item['created_at'])
     return item
 
+DATED_COLLECTIONS = ["users", "students", "payments", "expenses", "payment_settings", "payments_archive", "expenses_archive"]
+
+async def migrate_created_at(batch_size: int = 1000) -> dict:
+    # One-off conversion of ISO string created_at values to BSON datetimes
+    migrated = {}
+    for collection_name in DATED_COLLECTIONS:
+        collection = db[collection_name]
+        migrated[collection_name] = 0
+        while True:
+            batch = await collection.find(
+                {"created_at": {"$type": "string"}}, {"_id": 1, "created_at": 1}
+            ).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+            await collection.bulk_write([
+                UpdateOne(
+                    {"_id": item["_id"], "created_at": item["created_at"]},
+                    {"$set": {"created_at": datetime.fromisoformat(item["created_at"])}}
+                )
+                for item in batch
+            ], ordered=False)
+            migrated[collection_name] += len(batch)
+    return migrated
+
+# Deleted students keep their document, marked with deleted_at, until the background
+# purge has removed their payments; every student query filters them out
+ACTIVE_STUDENT = {"deleted_at": None}
+
+# Academic years: settings are kept per year and the latest one saved is active.
+# Closing a year moves its payments and expenses into archive collections, so the
+# live collections and their indexes only hold open years. Settings saved before
+# years were tracked carry no active flag and count as active
+ARCHIVE_COLLECTIONS = {"payments": "payments_archive", "expenses": "expenses_archive"}
+ACTIVE_SETTINGS = {"active": {"$ne": False}}
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '500'))
+
+def collection_with_archive(name: str, database=None) -> list:
+    database = database or db
+    return [database[name], database[ARCHIVE_COLLECTIONS[name]]]
+
+async def active_academic_year(tesorero_id: str, database=None) -> str:
+    settings = await (database or db).payment_settings.find_one(
+        {"tesorero_id": tesorero_id, **ACTIVE_SETTINGS}, {"_id": 0, "academic_year": 1}
+    )
+    return settings["academic_year"] if settings else str(datetime.now(timezone.utc).year)
+
+async def closed_academic_years(tesorero_id: str) -> set:
+    return set(await db.payment_settings.distinct(
+        "academic_year", {"tesorero_id": tesorero_id, "closed_at": {"$ne": None}}
+    ))
+
+async def academic_year_scope(name: str, field: str, tesorero_id: str, year: Optional[str] = None, database=None):
+    # Collection, filter and whether the year has settings, for one year of payments or
+    # expenses: without a year the active one is used, a closed year is read from its
+    # archive. The active year also matches expenses recorded before they carried a year
+    database = database or db
+    if not year:
+        year = await active_academic_year(tesorero_id, database)
+        return database[name], {field: {"$in": [year, None]}}, True
+    settings = await database.payment_settings.find_one(
+        {"tesorero_id": tesorero_id, "academic_year": year}, {"_id": 0, "active": 1, "closed_at": 1}
+    )
+    if settings and settings.get("closed_at"):
+        return database[ARCHIVE_COLLECTIONS[name]], {field: year}, True
+    if settings and settings.get("active", True):
+        return database[name], {field: {"$in": [year, None]}}, True
+    return database[name], {field: year}, settings is not None
+
+async def find_with_archive(name: str, query: dict, projection: dict) -> Optional[dict]:
+    # Single document lookups by id fall back to the archive once the year is closed
+    for collection in collection_with_archive(name):
+        document = await collection.find_one(query, projection)
+        if document:
+            return document
+    return None
+
+async def archive_documents(name: str, query: dict) -> int:
+    source, archive = collection_with_archive(name)
+    archived = 0
+    while True:
+        documents = await source.find(query).limit(ARCHIVE_BATCH_SIZE).to_list(None)
+        if not documents:
+            return archived
+        
+        async def move_batch(session):
+            try:
+                await archive.insert_many(documents, ordered=False, session=session)
+            except BulkWriteError as error:
+                # Rows copied by an interrupted earlier run keep their _id and are skipped
+                if any(write_error["code"] != 11000 for write_error in error.details["writeErrors"]):
+                    raise
+            await source.delete_many({"_id": {"$in": [document["_id"] for document in documents]}}, session=session)
+        
+        await run_batch(move_batch)
+        archived += len(documents)
+        await asyncio.sleep(PURGE_PAUSE_SECONDS)
+
+async def assign_expense_years() -> dict:
+    # Expenses recorded before they carried an academic year go to the tesorero's active year
+    assigned = {}
+    for tesorero_id in await db.expenses.distinct("tesorero_id", {"academic_year": None}):
+        year = await active_academic_year(tesorero_id)
+        result = await db.expenses.update_many(
+            {"tesorero_id": tesorero_id, "academic_year": None}, {"$set": {"academic_year": year}}
+        )
+        assigned[tesorero_id] = result.modified_count
+    return assigned
+
+# Ledger totals: one document per tesorero with running income/expense totals,
+# student count and paid payments per year and month, kept current with $inc
+def empty_ledger(tesorero_id: str) -> dict:
+    return {"tesorero_id": tesorero_id, "total_income": 0.0, "total_expenses": 0.0, "student_count": 0, "paid_counts": {}}
+
+async def update_ledger(tesorero_id: str, income: float = 0, expenses: float = 0, students: int = 0, paid_counts: Optional[dict] = None):
+    increments = {}
+    if income:
+        increments["total_income"] = income
+    if expenses:
+        increments["total_expenses"] = expenses
+    if students:
+        increments["student_count"] = students
+    for (year, month), count in (paid_counts or {}).items():
+        if count:
+            increments[f"paid_counts.{year}.{month}"] = count
+    if not increments:
+        return
+    # No upsert: a missing ledger is rebuilt from the raw collections on its next read
+    await db.ledger_totals.update_one({"tesorero_id": tesorero_id}, {"$inc": increments})
+
+def payment_ledger_delta(before: Optional[dict], after: Optional[dict]):
+    # Income and paid count change between two versions of the same payment row
+    income = 0
+    paid_counts = {}
+    for payment, sign in ((before, -1), (after, 1)):
+        if payment and payment.get("paid"):
+            income += sign * payment["amount"]
+            key = (payment["year"], payment["month"])
+            paid_counts[key] = paid_counts.get(key, 0) + sign
+    return income, paid_counts
+
+async def compute_ledger(tesorero_id: str) -> dict:
+    ledger = empty_ledger(tesorero_id)
+    students = await db.students.find({"tesorero_id": tesorero_id, **ACTIVE_STUDENT}, {"_id": 0, "id": 1}).to_list(None)
+    ledger["student_count"] = len(students)
+    
+    # Totals span every year, archived ones included
+    paid_groups = await paid_payment_groups([student["id"] for student in students])
+    for (year, month), (amount, count) in paid_groups.items():
+        ledger["total_income"] += amount
+        ledger["paid_counts"].setdefault(year, {})[month] = count
+    
+    for collection in collection_with_archive("expenses"):
+        expense_totals = await collection.aggregate([
+            {"$match": {"tesorero_id": tesorero_id}},
+            {"$group": {"_id": None, "amount": {"$sum": "$amount"}}}
+        ]).to_list(1)
+        if expense_totals:
+            ledger["total_expenses"] += expense_totals[0]["amount"]
+    return ledger
+
+async def paid_payment_groups(student_ids: list) -> dict:
+    # Paid amount and count per (year, month) over live and archived payments
+    groups = {}
+    for collection in collection_with_archive("payments"):
+        async for group in collection.aggregate([
+            {"$match": {"student_id": {"$in": student_ids}, "paid": True}},
+            {"$group": {"_id": {"year": "$year", "month": "$month"}, "amount": {"$sum": "$amount"}, "count": {"$sum": 1}}}
+        ]):
+            key = (group["_id"]["year"], group["_id"]["month"])
+            amount, count = groups.get(key, (0, 0))
+            groups[key] = (amount + group["amount"], count + group["count"])
+    return groups
+
+async def rebuild_ledger(tesorero_id: str) -> dict:
+    ledger = await compute_ledger(tesorero_id)
+    await db.ledger_totals.replace_one({"tesorero_id": tesorero_id}, ledger, upsert=True)
+    return ledger
+
+async def get_ledger(tesorero_id: str, database=None) -> dict:
+    # A missing ledger is always rebuilt through the primary
+    ledger = await (database or db).ledger_totals.find_one({"tesorero_id": tesorero_id}, {"_id": 0})
+    return ledger or await rebuild_ledger(tesorero_id)
+
+def ledger_drift(stored: dict, actual: dict) -> dict:
+    drift = {}
+    for field in ("total_income", "total_expenses"):
+        if abs(stored.get(field, 0) - actual[field]) > 0.005:
+            drift[field] = {"stored": stored.get(field, 0), "actual": actual[field]}
+    if stored.get("student_count", 0) != actual["student_count"]:
+        drift["student_count"] = {"stored": stored.get("student_count", 0), "actual": actual["student_count"]}
+    stored_counts = {
+        (year, month): count
+        for year, months in stored.get("paid_counts", {}).items() for month, count in months.items() if count
+    }
+    actual_counts = {
+        (year, month): count
+        for year, months in actual["paid_counts"].items() for month, count in months.items()
+    }
+    for year, month in sorted(set(stored_counts) | set(actual_counts)):
+        if stored_counts.get((year, month), 0) != actual_counts.get((year, month), 0):
+            drift[f"paid_counts.{year}.{month}"] = {
+                "stored": stored_counts.get((year, month), 0), "actual": actual_counts.get((year, month), 0)
+            }
+    return drift
+
+async def reconcile_ledgers(tesorero_id: Optional[str] = None, dry_run: bool = False) -> dict:
+    # Rebuilds ledgers from payments/expenses/students and reports what had drifted
+    query = {"id": tesorero_id} if tesorero_id else {}
+    drifted = {}
+    async for user in db.users.find(query, {"_id": 0, "id": 1}):
+        stored = await db.ledger_totals.find_one({"tesorero_id": user["id"]}, {"_id": 0}) or {}
+        actual = await compute_ledger(user["id"])
+        drift = ledger_drift(stored, actual)
+        if drift:
+            drifted[user["id"]] = drift
+        if not dry_run and (drift or not stored):
+            await db.ledger_totals.replace_one({"tesorero_id": user["id"]}, actual, upsert=True)
+    return drifted
+
+# Live updates: write routes publish per-tesorero events to an in-process bus whose
+# subscribers are the open /api/events streams
+EVENT_QUEUE_SIZE = 100
+EVENT_HEARTBEAT_SECONDS = 15
+EVENT_SOURCE = os.environ.get('EVENT_SOURCE', 'local')
+
+class EventBus:
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.subscribers = {}
+
+    def subscribe(self, tesorero_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.setdefault(tesorero_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, tesorero_id: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(tesorero_id)
+        if queues:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[tesorero_id]
+
+    def has_subscribers(self, tesorero_id: str) -> bool:
+        return tesorero_id in self.subscribers
+
+    def publish(self, tesorero_id: str, event: dict):
+        for queue in self.subscribers.get(tesorero_id, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A client that stopped reading is told to reload instead of buffering forever
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync", "data": None})
+
+event_bus = EventBus(EVENT_QUEUE_SIZE)
+
+async def publish_change(tesorero_id: str, event_type: str, data=None, ledger_changed: bool = True):
+    if not event_bus.has_subscribers(tesorero_id):
+        return
+    event_bus.publish(tesorero_id, {"type": event_type, "data": jsonable_encoder(data)})
+    # With change streams, totals after a ledger write come from the ledger watcher of every worker
+    if EVENT_SOURCE == 'local' or not ledger_changed:
+        summary = await build_dashboard_summary(tesorero_id)
+        event_bus.publish(tesorero_id, {"type": "totals", "data": jsonable_encoder(summary)})
+
 # Authentication routes
 @api_router.post("/auth/register")
 async def register(user_data: UserCreate):
@@ -172,21 +1272,28 @@ async def register(user_data: UserCreate):
     # Create user
     user = User(
         username=user_data.username,
-        password=hash_password(user_data.password),
+        password=await run_password_task(hash_password, user_data.password),
         paralelo_name=user_data.paralelo_name
     )
     
     user_dict = prepare_for_mongo(user.dict())
     await db.users.insert_one(user_dict)
+    await db.ledger_totals.insert_one(empty_ledger(user.id))
     
     return {"message": "User registered successfully"}
 
 @api_router.post("/auth/login")
 async def login(login_data: UserLogin):
     user = await db.users.find_one({"username": login_data.username})
-    if not user or not verify_password(login_data.password, user["password"]):
+    valid, new_hash = await run_password_task(verify_password, login_data.password, user["password"] if user else None)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    if new_hash:
+        # Only replace the hash that was just verified, in case it changed meanwhile
+        await db.users.update_one({"id": user["id"], "password": user["password"]}, {"$set": {"password": new_hash}})
+        invalidate_cached_user(user["id"])
+    
     token = create_jwt_token(user["id"])
     user_response = UserResponse(**parse_from_mongo(user))
     
@@ -200,7 +1307,7 @@ async def get_me(current_user: UserResponse = Depends(get_current_user)):
 @api_router.post("/students", response_model=Student)
 async def create_student(student_data: StudentCreate, current_user: UserResponse = Depends(get_current_user)):
     # Check if cedula already exists for this tesorero
-    existing_student = await db.students.find_one({"cedula": student_data.cedula, "tesorero_id": current_user.id})
+    existing_student = await db.students.find_one({"cedula": student_data.cedula, "tesorero_id": current_user.id, **ACTIVE_STUDENT})
     if existing_student:
         raise HTTPException(status_code=400, detail="Student with this cedula already exists")
     
@@ -212,105 +1319,658 @@ async def create_student(student_data: StudentCreate, current_user: UserResponse
     
     student_dict = prepare_for_mongo(student.dict())
     await db.students.insert_one(student_dict)
+    await update_ledger(current_user.id, students=1)
+    await invalidate_public_cache(current_user.id)
+    await publish_change(current_user.id, "student_added", student)
     
     return student
 
+# Student import: rows are parsed in chunks so large files never sit fully in memory
+IMPORT_CHUNK_SIZE = 500
+IMPORT_COLUMNS = {"name": "name", "nombre": "name", "cedula": "cedula", "cédula": "cedula"}
+CEDULA_LENGTH = 10
+
+def import_columns(header) -> dict:
+    columns = {}
+    for position, title in enumerate(header):
+        field = IMPORT_COLUMNS.get(str(title or "").strip().lower())
+        if field:
+            columns[field] = position
+    if set(columns) != {"name", "cedula"}:
+        raise HTTPException(status_code=400, detail="File must have 'name' and 'cedula' columns")
+    return columns
+
+def cell_text(value) -> str:
+    return "" if value is None else str(value).strip()
+
+def cedula_cell_text(value) -> str:
+    # A cedula typed as a number loses its leading zeros in the spreadsheet
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return str(value).zfill(CEDULA_LENGTH)
+    return cell_text(value)
+
+def csv_row_chunks(file):
+    # dtype=str keeps leading zeros in cedulas
+    reader = pd.read_csv(file, dtype=str, keep_default_na=False, chunksize=IMPORT_CHUNK_SIZE)
+    columns = None
+    row_number = 1
+    for frame in reader:
+        if columns is None:
+            columns = import_columns(frame.columns)
+        chunk = []
+        for values in frame.itertuples(index=False):
+            row_number += 1
+            chunk.append((row_number, cell_text(values[columns["name"]]), cell_text(values[columns["cedula"]])))
+        yield chunk
+
+def xlsx_row_chunks(file):
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        columns = import_columns(next(rows, ()))
+        chunk = []
+        for row_number, values in enumerate(rows, start=2):
+            if not any(value is not None for value in values):
+                continue
+            values = list(values) + [None] * (max(columns.values()) + 1 - len(values))
+            chunk.append((row_number, cell_text(values[columns["name"]]), cedula_cell_text(values[columns["cedula"]])))
+            if len(chunk) == IMPORT_CHUNK_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        workbook.close()
+
+@api_router.post("/students/import", response_model=StudentImportResult)
+async def import_students(file: UploadFile = File(...), current_user: UserResponse = Depends(get_current_user)):
+    filename = (file.filename or "").lower()
+    if filename.endswith(".csv"):
+        chunks = csv_row_chunks(file.file)
+    elif filename.endswith(".xlsx"):
+        chunks = xlsx_row_chunks(file.file)
+    else:
+        raise HTTPException(status_code=400, detail="File must be .csv or .xlsx")
+    
+    # Existing cedulas for this tesorero, loaded with one query
+    existing_students = await db.students.find({"tesorero_id": current_user.id, **ACTIVE_STUDENT}, {"_id": 0, "cedula": 1}).to_list(None)
+    known_cedulas = {student["cedula"] for student in existing_students}
+    
+    imported = 0
+    rejected = []
+    last_row = 1
+    try:
+        while True:
+            # Parsing is blocking, so each chunk is read in the threadpool
+            try:
+                chunk = await run_in_threadpool(next, chunks, None)
+            except (ValueError, KeyError, pd.errors.ParserError, zipfile.BadZipFile, InvalidFileException) as e:
+                if not imported:
+                    raise HTTPException(status_code=400, detail=f"Could not read file: {e}")
+                # Earlier chunks are already stored, so the import is reported as partial
+                rejected.append(StudentImportRejection(row=last_row + 1, reason=f"Could not read file from this row on: {e}"))
+                break
+            if chunk is None:
+                break
+            if chunk:
+                last_row = chunk[-1][0]
+            
+            students = []
+            rows = []
+            for row_number, name, cedula in chunk:
+                if not name or not cedula:
+                    rejected.append(StudentImportRejection(row=row_number, cedula=cedula or None, reason="Missing name or cedula"))
+                    continue
+                if cedula in known_cedulas:
+                    rejected.append(StudentImportRejection(row=row_number, cedula=cedula, reason="Student with this cedula already exists"))
+                    continue
+                known_cedulas.add(cedula)
+                student = Student(name=name, cedula=cedula, tesorero_id=current_user.id)
+                students.append(prepare_for_mongo(student.dict()))
+                rows.append((row_number, cedula))
+            
+            if not students:
+                continue
+            try:
+                await db.students.insert_many(students, ordered=False)
+                imported += len(students)
+            except BulkWriteError as e:
+                # Rows inserted concurrently by another request hit the unique index
+                failed = {error["index"] for error in e.details.get("writeErrors", [])}
+                imported += len(students) - len(failed)
+                for position in sorted(failed):
+                    row_number, cedula = rows[position]
+                    rejected.append(StudentImportRejection(row=row_number, cedula=cedula, reason="Student with this cedula already exists"))
+    finally:
+        # Stored students count even when a later chunk fails
+        if imported:
+            await update_ledger(current_user.id, students=imported)
+            await invalidate_public_cache(current_user.id)
+            await publish_change(current_user.id, "students_imported", {"imported": imported})
+    
+    return StudentImportResult(imported=imported, rejected=rejected)
+
 @api_router.get("/students", response_model=List[Student])
-async def get_students(current_user: UserResponse = Depends(get_current_user)):
-    students = await db.students.find({"tesorero_id": current_user.id}).to_list(1000)
-    return [Student(**parse_from_mongo(student)) for student in students]
+async def get_students(
+    response: Response,
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    query = await keyset_query(db.students, {"tesorero_id": current_user.id, **ACTIVE_STUDENT}, after)
+    cursor = db.students.find(query, {"_id": 0}).sort(LIST_SORT)
+    if limit:
+        cursor = cursor.limit(limit)
+    return await list_response(cursor, Student, response, limit, stream)
 
 @api_router.delete("/students/{student_id}")
 async def delete_student(student_id: str, current_user: UserResponse = Depends(get_current_user)):
-    # Check if student belongs to current user
-    student = await db.students.find_one({"id": student_id, "tesorero_id": current_user.id})
+    # Mark the student deleted in one step; the cedula is released right away so it can
+    # be registered again, and the related data is purged in the background
+    student = await db.students.find_one_and_update(
+        {"id": student_id, "tesorero_id": current_user.id, **ACTIVE_STUDENT},
+        [{"$set": {"deleted_at": datetime.now(timezone.utc), "deleted_cedula": "$cedula", "cedula": f"deleted:{student_id}"}}],
+        projection={"_id": 0, "id": 1}
+    )
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    # Delete student and all related payments
-    await db.students.delete_one({"id": student_id})
-    await db.payments.delete_many({"student_id": student_id})
+    # The student's payments leave the ledger now, grouped per month
+    paid_groups = await paid_payment_groups([student_id])
+    income = -sum(amount for amount, _ in paid_groups.values())
+    paid_counts = {key: -count for key, (_, count) in paid_groups.items()}
+    await update_ledger(current_user.id, income=income, students=-1, paid_counts=paid_counts)
+    await invalidate_public_cache(current_user.id)
+    await publish_change(current_user.id, "student_deleted", {"id": student_id})
+    schedule_student_purge()
     
     return {"message": "Student deleted successfully"}
 
+# Background purge of deleted students: payments, expense references and images no
+# longer referenced are removed in small batches, each batch in its own transaction
+# when the deployment supports them, so no single write holds locks for long
+PURGE_BATCH_SIZE = int(os.environ.get('PURGE_BATCH_SIZE', '200'))
+PURGE_PAUSE_SECONDS = float(os.environ.get('PURGE_PAUSE_SECONDS', '0.05'))
+PURGE_LEASE_SECONDS = 300
+purge_task = None
+purge_retry = None
+purge_requested = False
+transactions_supported = None
+
+async def supports_transactions() -> bool:
+    global transactions_supported
+    if transactions_supported is None:
+        hello = await client.admin.command("hello")
+        transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+    return transactions_supported
+
+async def run_batch(operation):
+    if not await supports_transactions():
+        return await operation(None)
+    async with await client.start_session() as session:
+        return await session.with_transaction(operation)
+
+async def image_referenced(digest: str) -> bool:
+    if await find_with_archive("payments", {"receipt_image": digest}, {"_id": 1}):
+        return True
+    return await find_with_archive("expenses", {"activity_image": digest}, {"_id": 1}) is not None
+
+async def delete_unreferenced_images(digests: set):
+    uploaded_before = datetime.now(timezone.utc) - timedelta(seconds=IMAGE_UPLOAD_GRACE_SECONDS)
+    for digest in digests:
+        if await image_referenced(digest):
+            continue
+        # The variants document goes first and only when the image was not uploaded again
+        # recently: a form may be about to reference it
+        variants = await db.image_variants.find_one_and_delete(
+            {"digest": digest, "uploaded_at": {"$not": {"$gte": uploaded_before}}}, projection={"_id": 0}
+        )
+        if not variants and await db.image_variants.find_one({"digest": digest}, {"_id": 1}):
+            continue
+        for name in IMAGE_VARIANTS:
+            variant = (variants or {}).get(name)
+            if not variant or variant == digest:
+                continue
+            # A variant can also be an image in its own right, uploaded or referenced directly
+            if await image_referenced(variant) or await db.image_variants.find_one({"digest": variant}, {"_id": 1}):
+                continue
+            await image_store.delete(variant)
+        await image_store.delete(digest)
+
+async def purge_student(student: dict):
+    student_id = student["id"]
+    
+    for payments_collection in collection_with_archive("payments"):
+        while True:
+            payments = await payments_collection.find(
+                {"student_id": student_id}, {"_id": 0, "id": 1, "receipt_image": 1}
+            ).limit(PURGE_BATCH_SIZE).to_list(None)
+            if not payments:
+                break
+            
+            async def delete_payments(session):
+                await payments_collection.delete_many({"id": {"$in": [payment["id"] for payment in payments]}}, session=session)
+            await run_batch(delete_payments)
+            await delete_unreferenced_images({payment["receipt_image"] for payment in payments if payment.get("receipt_image")})
+            await asyncio.sleep(PURGE_PAUSE_SECONDS)
+    
+    for expenses_collection in collection_with_archive("expenses"):
+        while True:
+            expenses = await expenses_collection.find(
+                {"responsible_student_id": student_id}, {"_id": 0, "id": 1}
+            ).limit(PURGE_BATCH_SIZE).to_list(None)
+            if not expenses:
+                break
+            
+            async def clear_references(session):
+                await expenses_collection.update_many(
+                    {"id": {"$in": [expense["id"] for expense in expenses]}},
+                    {"$set": {"responsible_student_id": None}},
+                    session=session
+                )
+            await run_batch(clear_references)
+            await asyncio.sleep(PURGE_PAUSE_SECONDS)
+    
+    await db.students.delete_one({"id": student_id})
+    await invalidate_public_cache(student["tesorero_id"])
+
+async def claim_deleted_student() -> Optional[dict]:
+    # A claim left by a crashed worker expires after the lease, so pending purges always resume
+    now = datetime.now(timezone.utc)
+    return await db.students.find_one_and_update(
+        {
+            "deleted_at": {"$exists": True},
+            "$or": [{"purge_claimed_at": None}, {"purge_claimed_at": {"$lt": now - timedelta(seconds=PURGE_LEASE_SECONDS)}}]
+        },
+        {"$set": {"purge_claimed_at": now}},
+        projection={"_id": 0, "id": 1, "tesorero_id": 1}
+    )
+
+async def purge_deleted_students():
+    global purge_requested
+    student = None
+    try:
+        # Deletions requested while a pass is running trigger another pass
+        while purge_requested:
+            purge_requested = False
+            while student := await claim_deleted_student():
+                await purge_student(student)
+    except Exception:
+        # The failed student's claim has to expire before another pass can pick it up
+        failed = f"student {student['id']}" if student else "deleted students"
+        logger.exception(f"Purge of {failed} failed, retrying in {PURGE_LEASE_SECONDS}s")
+        schedule_purge_retry()
+
+def schedule_purge_retry():
+    global purge_retry
+    if purge_retry is None:
+        purge_retry = asyncio.get_running_loop().call_later(PURGE_LEASE_SECONDS + 1, retry_student_purge)
+
+def retry_student_purge():
+    global purge_retry
+    purge_retry = None
+    schedule_student_purge()
+
+def schedule_student_purge():
+    global purge_task, purge_requested
+    purge_requested = True
+    if purge_task is None or purge_task.done():
+        purge_task = asyncio.create_task(purge_deleted_students())
+
 # Payment settings routes
 @api_router.post("/payment-settings", response_model=PaymentSettings)
 async def create_payment_settings(settings_data: PaymentSettingsCreate, current_user: UserResponse = Depends(get_current_user)):
-    # Delete existing settings for this user
-    await db.payment_settings.delete_many({"tesorero_id": current_user.id})
+    # Settings are kept per academic year; saving a year makes it the active one
+    if settings_data.academic_year in await closed_academic_years(current_user.id):
+        raise HTTPException(status_code=409, detail="Academic year is closed")
     
-    settings = PaymentSettings(
-        tesorero_id=current_user.id,
-        monthly_amount=settings_data.monthly_amount,
-        selected_months=settings_data.selected_months,
-        academic_year=settings_data.academic_year
+    settings = await db.payment_settings.find_one_and_update(
+        {"tesorero_id": current_user.id, "academic_year": settings_data.academic_year},
+        {
+            "$set": {
+                "monthly_amount": settings_data.monthly_amount,
+                "selected_months": settings_data.selected_months,
+                "active": True
+            },
+            "$setOnInsert": {"id": str(uuid.uuid4()), "created_at": datetime.now(timezone.utc)}
+        },
+        projection={"_id": 0},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
     )
-    
-    settings_dict = prepare_for_mongo(settings.dict())
-    await db.payment_settings.insert_one(settings_dict)
+    await db.payment_settings.update_many(
+        {"tesorero_id": current_user.id, "academic_year": {"$ne": settings_data.academic_year}},
+        {"$set": {"active": False}}
+    )
+    settings = PaymentSettings(**parse_from_mongo(settings))
+    await invalidate_public_cache(current_user.id)
+    await publish_change(current_user.id, "settings_updated", settings, ledger_changed=False)
     
     return settings
 
 @api_router.get("/payment-settings", response_model=Optional[PaymentSettings])
-async def get_payment_settings(current_user: UserResponse = Depends(get_current_user)):
-    settings = await db.payment_settings.find_one({"tesorero_id": current_user.id})
+async def get_payment_settings(year: Optional[str] = None, current_user: UserResponse = Depends(get_current_user)):
+    settings_filter = {"academic_year": year} if year else ACTIVE_SETTINGS
+    settings = await db.payment_settings.find_one({"tesorero_id": current_user.id, **settings_filter})
     if settings:
         return PaymentSettings(**parse_from_mongo(settings))
     return None
 
+# Academic year routes
+@api_router.get("/academic-years", response_model=List[PaymentSettings])
+async def get_academic_years(current_user: UserResponse = Depends(get_current_user)):
+    years = await db.payment_settings.find({"tesorero_id": current_user.id}, {"_id": 0}).sort("academic_year", ASCENDING).to_list(None)
+    return [PaymentSettings(**parse_from_mongo(settings)) for settings in years]
+
+@api_router.post("/academic-years/{year}/close", response_model=AcademicYearCloseResult)
+async def close_academic_year(year: str, current_user: UserResponse = Depends(get_current_user)):
+    settings = await db.payment_settings.find_one(
+        {"tesorero_id": current_user.id, "academic_year": year}, {"_id": 0, "active": 1}
+    )
+    if not settings:
+        raise HTTPException(status_code=404, detail="Academic year not found")
+    if settings.get("active", True):
+        raise HTTPException(status_code=400, detail="The active academic year cannot be closed")
+    
+    # Writes to the year are rejected from here on; closing again resumes an interrupted move
+    await db.payment_settings.update_one(
+        {"tesorero_id": current_user.id, "academic_year": year, "closed_at": None},
+        {"$set": {"closed_at": datetime.now(timezone.utc)}}
+    )
+    # Deleted students awaiting purge are included; the purge also covers the archive
+    students = await db.students.find({"tesorero_id": current_user.id}, {"_id": 0, "id": 1}).to_list(None)
+    payments_archived = await archive_documents(
+        "payments", {"student_id": {"$in": [student["id"] for student in students]}, "year": year}
+    )
+    expenses_archived = await archive_documents("expenses", {"tesorero_id": current_user.id, "academic_year": year})
+    
+    await invalidate_public_cache(current_user.id)
+    await publish_change(current_user.id, "year_closed", {"academic_year": year}, ledger_changed=False)
+    return AcademicYearCloseResult(
+        academic_year=year, payments_archived=payments_archived, expenses_archived=expenses_archived
+    )
+
 # Payment routes
+def payment_upsert(payment_data: PaymentCreate, receipt_image: Optional[str], receipt_thumbnail: Optional[str]):
+    payment_filter = {
+        "student_id": payment_data.student_id,
+        "month": payment_data.month,
+        "year": payment_data.year
+    }
+    payment_update = {
+        "$set": {
+            "paid": True,
+            "amount": payment_data.amount,
+            "receipt_image": receipt_image,
+            "receipt_thumbnail": receipt_thumbnail,
+            "created_at": datetime.now(timezone.utc)
+        },
+        "$setOnInsert": {"id": str(uuid.uuid4())}
+    }
+    return payment_filter, payment_update
+
 @api_router.post("/payments", response_model=MonthlyPayment)
 async def create_payment(payment_data: PaymentCreate, current_user: UserResponse = Depends(get_current_user)):
     # Verify student belongs to current user
-    student = await db.students.find_one({"id": payment_data.student_id, "tesorero_id": current_user.id})
+    student = await db.students.find_one({"id": payment_data.student_id, "tesorero_id": current_user.id, **ACTIVE_STUDENT}, {"_id": 1})
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
+    if payment_data.year in await closed_academic_years(current_user.id):
+        raise HTTPException(status_code=409, detail="Academic year is closed")
     
-    # Check if payment already exists
-    existing_payment = await db.payments.find_one({
-        "student_id": payment_data.student_id,
-        "month": payment_data.month,
-        "year": payment_data.year
-    })
-    
-    if existing_payment:
-        # Update existing payment
-        await db.payments.update_one(
-            {"id": existing_payment["id"]},
-            {"$set": {
-                "paid": True,
-                "amount": payment_data.amount,
-                "receipt_image": payment_data.receipt_image,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }}
+    receipt_image = await resolve_image_reference(payment_data.receipt_image)
+    receipt_thumbnail = await image_thumbnail(receipt_image)
+    
+    # Insert or overwrite the month's payment atomically; the unique
+    # (student_id, month, year) index turns concurrent submissions into one row
+    # The previous version of the row is returned so the ledger can apply the difference
+    payment_filter, payment_update = payment_upsert(payment_data, receipt_image, receipt_thumbnail)
+    try:
+        previous = await db.payments.find_one_and_update(
+            payment_filter, payment_update,
+            projection={"_id": 0}, upsert=True, return_document=ReturnDocument.BEFORE
         )
-        updated_payment = await db.payments.find_one({"id": existing_payment["id"]})
-        return MonthlyPayment(**parse_from_mongo(updated_payment))
-    else:
-        # Create new payment
-        payment = MonthlyPayment(
-            student_id=payment_data.student_id,
-            month=payment_data.month,
-            year=payment_data.year,
-            paid=True,
-            amount=payment_data.amount,
-            receipt_image=payment_data.receipt_image
+    except DuplicateKeyError:
+        # Lost an upsert race to a concurrent insert; the row now exists, so update it
+        previous = await db.payments.find_one_and_update(
+            payment_filter, payment_update,
+            projection={"_id": 0}, return_document=ReturnDocument.BEFORE
         )
+    payment = {**payment_update["$setOnInsert"], **(previous or {}), **payment_filter, **payment_update["$set"]}
+    
+    income, paid_counts = payment_ledger_delta(previous, payment)
+    await update_ledger(current_user.id, income=income, paid_counts=paid_counts)
+    await invalidate_public_cache(current_user.id)
+    
+    payment = MonthlyPayment(**parse_from_mongo(payment))
+    await publish_change(current_user.id, "payment_recorded", payment)
+    return payment
+
+MAX_BULK_PAYMENTS = 500
+BULK_WRITE_ATTEMPTS = 5
+
+@api_router.post("/payments/bulk", response_model=List[BulkPaymentResult])
+async def create_payments_bulk(payments_data: List[PaymentCreate], current_user: UserResponse = Depends(get_current_user)):
+    if len(payments_data) > MAX_BULK_PAYMENTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_PAYMENTS} payments per request")
+    
+    # Verify all students belong to current user with one query
+    requested_ids = list({payment_data.student_id for payment_data in payments_data})
+    owned_students = await db.students.find(
+        {"id": {"$in": requested_ids}, "tesorero_id": current_user.id, **ACTIVE_STUDENT}, {"_id": 0, "id": 1}
+    ).to_list(None)
+    owned_ids = {student["id"] for student in owned_students}
+    closed_years = await closed_academic_years(current_user.id)
+    
+    results = [BulkPaymentResult(index=index, status="error") for index in range(len(payments_data))]
+    pending = []
+    seen_keys = set()
+    for index, payment_data in enumerate(payments_data):
+        key = (payment_data.student_id, payment_data.month, payment_data.year)
+        if payment_data.student_id not in owned_ids:
+            results[index].detail = "Student not found"
+            continue
+        if payment_data.year in closed_years:
+            results[index].detail = "Academic year is closed"
+            continue
+        if key in seen_keys:
+            results[index].detail = "Duplicate payment in request"
+            continue
+        try:
+            receipt_image = await resolve_image_reference(payment_data.receipt_image)
+        except HTTPException as e:
+            results[index].detail = e.detail
+            continue
+        seen_keys.add(key)
+        receipt_thumbnail = await image_thumbnail(receipt_image)
+        pending.append((index, *payment_upsert(payment_data, receipt_image, receipt_thumbnail)))
+    
+    if not pending:
+        return results
+    
+    income = 0
+    paid_counts = {}
+    written = []
+    for _ in range(BULK_WRITE_ATTEMPTS):
+        if not pending:
+            break
+        
+        # Current versions of the rows, so the ledger can apply the difference
+        existing = await db.payments.find({"$or": [payment_filter for _, payment_filter, _ in pending]}, {"_id": 0}).to_list(None)
+        existing_by_key = {(payment["student_id"], payment["month"], payment["year"]): payment for payment in existing}
+        
+        # Each write only applies to the row version read above: new rows are inserted and
+        # existing ones matched on the fields the ledger depends on. A row changed in between
+        # fails with a duplicate key error, since the upsert then collides with the row
+        operations = []
+        previous_rows = []
+        for _, payment_filter, payment_update in pending:
+            previous = existing_by_key.get((payment_filter["student_id"], payment_filter["month"], payment_filter["year"]))
+            if previous:
+                operations.append(UpdateOne(
+                    {**payment_filter, "id": previous["id"], "paid": previous.get("paid"), "amount": previous.get("amount")},
+                    {"$set": payment_update["$set"]},
+                    upsert=True
+                ))
+            else:
+                operations.append(InsertOne({**payment_filter, **payment_update["$setOnInsert"], **payment_update["$set"]}))
+            previous_rows.append(previous)
         
-        payment_dict = prepare_for_mongo(payment.dict())
-        await db.payments.insert_one(payment_dict)
+        # Write every item in one round-trip; unordered so one failure does not stop the rest
+        try:
+            bulk_result = (await db.payments.bulk_write(operations, ordered=False)).bulk_api_result
+        except BulkWriteError as e:
+            bulk_result = e.details
+        upserted = {item["index"] for item in bulk_result.get("upserted", [])}
+        failed = {item["index"]: item for item in bulk_result.get("writeErrors", [])}
         
-        return payment
+        retry = []
+        for position, (index, payment_filter, payment_update) in enumerate(pending):
+            if position in failed:
+                if failed[position].get("code") == 11000:
+                    retry.append(pending[position])
+                else:
+                    results[index].detail = failed[position].get("errmsg", "Write failed")
+                continue
+            # An upsert here means the row was deleted after it was read
+            previous = None if position in upserted else previous_rows[position]
+            payment = {**(previous or payment_update["$setOnInsert"]), **payment_filter, **payment_update["$set"]}
+            written.append((index, payment_filter, payment, previous is None))
+            
+            payment_income, payment_counts = payment_ledger_delta(previous, payment)
+            income += payment_income
+            for count_key, count in payment_counts.items():
+                paid_counts[count_key] = paid_counts.get(count_key, 0) + count
+        pending = retry
+    
+    for index, _, _ in pending:
+        results[index].detail = "Payment was changed by a concurrent request, try again"
+    
+    # Read back the written rows with one query
+    current = []
+    if written:
+        current = await db.payments.find({"$or": [payment_filter for _, payment_filter, _, _ in written]}, {"_id": 0}).to_list(None)
+    current_by_key = {(payment["student_id"], payment["month"], payment["year"]): payment for payment in current}
+    
+    for index, payment_filter, payment, created in written:
+        current_payment = current_by_key.get((payment_filter["student_id"], payment_filter["month"], payment_filter["year"]))
+        if current_payment is None:
+            # Deleted by a concurrent request after the write; that delete took the written
+            # row out of the ledger, so the write itself still counts
+            results[index].detail = "Payment was deleted by a concurrent request"
+            continue
+        results[index].status = "created" if created else "updated"
+        results[index].payment = MonthlyPayment(**parse_from_mongo(current_payment))
+    
+    await update_ledger(current_user.id, income=income, paid_counts=paid_counts)
+    await invalidate_public_cache(current_user.id)
+    await publish_change(current_user.id, "payments_recorded", [result.payment for result in results if result.payment])
+    
+    return results
+
+MONTHS = [
+    "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
+    "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"
+]
+
+def month_sort_key(month: str):
+    return (MONTHS.index(month), "") if month in MONTHS else (len(MONTHS), month)
+
+@api_router.get("/payments/matrix", response_model=PaymentMatrix)
+async def get_payment_matrix(year: Optional[str] = None, current_user: UserResponse = Depends(get_current_user)):
+    # Everything the payments page renders: settings plus a student x month grid for one year,
+    # the active one unless asked otherwise; a closed year is read from the archive
+    settings_filter = {"academic_year": year} if year else ACTIVE_SETTINGS
+    settings = await db.payment_settings.find_one({"tesorero_id": current_user.id, **settings_filter}, {"_id": 0})
+    if settings:
+        settings = PaymentSettings(**parse_from_mongo(settings))
+    year = year or (settings.academic_year if settings else str(datetime.now(timezone.utc).year))
+    payments_collection = db[ARCHIVE_COLLECTIONS["payments"]] if settings and settings.closed_at else db.payments
+    
+    students = await db.students.find({"tesorero_id": current_user.id, **ACTIVE_STUDENT}, {"_id": 0}).sort(LIST_SORT).to_list(None)
+    payments = await payments_collection.aggregate([
+        {"$match": {"student_id": {"$in": [student["id"] for student in students]}, "year": year}},
+        {"$project": list_projection(PAYMENT_LIST_FIELDS, "receipt_image", False)}
+    ]).to_list(None)
+    payments_by_cell = {(payment["student_id"], payment["month"]): payment for payment in payments}
+    
+    # Selected months always get a column; months paid outside the selection are kept too
+    months = set(settings.selected_months if settings else [])
+    months.update(payment["month"] for payment in payments)
+    months = sorted(months, key=month_sort_key)
+    
+    rows = []
+    for student in students:
+        cells = []
+        for month in months:
+            payment = payments_by_cell.get((student["id"], month))
+            if payment and payment.get("paid"):
+                payment = parse_from_mongo(payment)
+                cells.append(PaymentMatrixCell(
+                    month=month,
+                    paid=True,
+                    amount=payment["amount"],
+                    payment_id=payment["id"],
+                    has_receipt_image=payment["has_receipt_image"],
+                    receipt_thumbnail=payment.get("receipt_thumbnail"),
+                    created_at=payment["created_at"]
+                ))
+            else:
+                cells.append(PaymentMatrixCell(month=month))
+        rows.append(PaymentMatrixRow(
+            student=Student(**parse_from_mongo(student)),
+            cells=cells,
+            total_paid=sum(cell.amount for cell in cells if cell.paid)
+        ))
+    
+    return model_response(PaymentMatrix(
+        year=year,
+        months=months,
+        settings=settings,
+        rows=rows,
+        total_paid=sum(row.total_paid for row in rows),
+        paid_count=sum(1 for row in rows for cell in row.cells if cell.paid)
+    ))
 
-@api_router.get("/payments", response_model=List[MonthlyPayment])
-async def get_payments(current_user: UserResponse = Depends(get_current_user)):
+@api_router.get("/payments", response_model=List[MonthlyPaymentListItem])
+async def get_payments(
+    response: Response,
+    include_images: bool = False,
+    year: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+    current_user: UserResponse = Depends(get_current_user)
+):
     # Get all students for this tesorero
-    students = await db.students.find({"tesorero_id": current_user.id}).to_list(1000)
+    students = await db.students.find({"tesorero_id": current_user.id, **ACTIVE_STUDENT}, {"_id": 0, "id": 1}).to_list(None)
     student_ids = [student["id"] for student in students]
     
-    # Get all payments for these students
-    payments = await db.payments.find({"student_id": {"$in": student_ids}}).to_list(1000)
-    return [MonthlyPayment(**parse_from_mongo(payment)) for payment in payments]
+    # Get one academic year of payments for these students, one page at a time when a limit is given
+    payments, year_filter, _ = await academic_year_scope("payments", "year", current_user.id, year)
+    query = await keyset_query(payments, {"student_id": {"$in": student_ids}, **year_filter}, after)
+    pipeline = [{"$match": query}, {"$sort": dict(LIST_SORT)}]
+    if limit:
+        pipeline.append({"$limit": limit})
+    pipeline.append({"$project": list_projection(PAYMENT_LIST_FIELDS, "receipt_image", include_images)})
+    return await list_response(payments.aggregate(pipeline), MonthlyPaymentListItem, response, limit, stream)
+
+@api_router.get("/payments/{payment_id}/receipt-image")
+async def get_payment_receipt_image(payment_id: str, current_user: UserResponse = Depends(get_current_user)):
+    payment = await find_with_archive("payments", {"id": payment_id}, {"_id": 0, "student_id": 1, "receipt_image": 1})
+    if not payment:
+        raise HTTPException(status_code=404, detail="Payment not found")
+    
+    student = await db.students.find_one({"id": payment["student_id"], "tesorero_id": current_user.id, **ACTIVE_STUDENT}, {"_id": 1})
+    if not student:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    
+    # The display variant is a compressed copy sized for screens; the original stays available
+    variants = await get_image_variants(payment.get("receipt_image"))
+    return {"receipt_image": payment.get("receipt_image"), "receipt_display": variants["display"] if variants else None}
 
 @api_router.delete("/payments/{payment_id}")
 async def delete_payment(payment_id: str, current_user: UserResponse = Depends(get_current_user)):
@@ -320,89 +1980,345 @@ async def delete_payment(payment_id: str, current_user: UserResponse = Depends(g
         raise HTTPException(status_code=404, detail="Payment not found")
     
     # Verify student belongs to current user
-    student = await db.students.find_one({"id": payment["student_id"], "tesorero_id": current_user.id})
+    student = await db.students.find_one({"id": payment["student_id"], "tesorero_id": current_user.id, **ACTIVE_STUDENT}, {"_id": 1})
     if not student:
         raise HTTPException(status_code=403, detail="Unauthorized")
     
-    await db.payments.delete_one({"id": payment_id})
+    # Only the request that actually removed the row adjusts the ledger
+    deleted = await db.payments.find_one_and_delete({"id": payment_id}, projection={"_id": 0})
+    if deleted:
+        income, paid_counts = payment_ledger_delta(deleted, None)
+        await update_ledger(current_user.id, income=income, paid_counts=paid_counts)
+        await invalidate_public_cache(current_user.id)
+        await publish_change(current_user.id, "payment_deleted", {
+            "id": payment_id, "student_id": deleted["student_id"], "month": deleted["month"], "year": deleted["year"]
+        })
     return {"message": "Payment deleted successfully"}
 
 # Expense routes
 @api_router.post("/expenses", response_model=Expense)
 async def create_expense(expense_data: ExpenseCreate, current_user: UserResponse = Depends(get_current_user)):
     # Verify responsible student belongs to current user
-    student = await db.students.find_one({"id": expense_data.responsible_student_id, "tesorero_id": current_user.id})
+    student = await db.students.find_one({"id": expense_data.responsible_student_id, "tesorero_id": current_user.id, **ACTIVE_STUDENT})
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
+    activity_image = await resolve_image_reference(expense_data.activity_image)
+    
     expense = Expense(
         tesorero_id=current_user.id,
         responsible_student_id=expense_data.responsible_student_id,
         description=expense_data.description,
         amount=expense_data.amount,
-        activity_image=expense_data.activity_image
+        activity_image=activity_image,
+        activity_thumbnail=await image_thumbnail(activity_image),
+        academic_year=await active_academic_year(current_user.id)
     )
     
     expense_dict = prepare_for_mongo(expense.dict())
     await db.expenses.insert_one(expense_dict)
+    await update_ledger(current_user.id, expenses=expense.amount)
+    await invalidate_public_cache(current_user.id)
+    await publish_change(current_user.id, "expense_added", expense)
     
     return expense
 
-@api_router.get("/expenses", response_model=List[Expense])
-async def get_expenses(current_user: UserResponse = Depends(get_current_user)):
-    expenses = await db.expenses.find({"tesorero_id": current_user.id}).to_list(1000)
-    return [Expense(**parse_from_mongo(expense)) for expense in expenses]
+@api_router.get("/expenses", response_model=List[ExpenseListItem])
+async def get_expenses(
+    response: Response,
+    include_images: bool = False,
+    year: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    expenses, year_filter, _ = await academic_year_scope("expenses", "academic_year", current_user.id, year)
+    query = await keyset_query(expenses, {"tesorero_id": current_user.id, **year_filter}, after)
+    pipeline = [{"$match": query}, {"$sort": dict(LIST_SORT)}]
+    if limit:
+        pipeline.append({"$limit": limit})
+    pipeline.append({"$project": list_projection(EXPENSE_LIST_FIELDS, "activity_image", include_images)})
+    return await list_response(expenses.aggregate(pipeline), ExpenseListItem, response, limit, stream)
+
+@api_router.get("/expenses/{expense_id}/activity-image")
+async def get_expense_activity_image(expense_id: str, current_user: UserResponse = Depends(get_current_user)):
+    expense = await find_with_archive("expenses", {"id": expense_id, "tesorero_id": current_user.id}, {"_id": 0, "activity_image": 1})
+    if not expense:
+        raise HTTPException(status_code=404, detail="Expense not found")
+    
+    variants = await get_image_variants(expense.get("activity_image"))
+    return {"activity_image": expense.get("activity_image"), "activity_display": variants["display"] if variants else None}
 
 @api_router.delete("/expenses/{expense_id}")
 async def delete_expense(expense_id: str, current_user: UserResponse = Depends(get_current_user)):
-    # Check if expense belongs to current user
-    expense = await db.expenses.find_one({"id": expense_id, "tesorero_id": current_user.id})
+    # Check if expense belongs to current user and delete it in one step
+    expense = await db.expenses.find_one_and_delete(
+        {"id": expense_id, "tesorero_id": current_user.id}, projection={"_id": 0, "amount": 1}
+    )
     if not expense:
         raise HTTPException(status_code=404, detail="Expense not found")
     
-    await db.expenses.delete_one({"id": expense_id})
+    await update_ledger(current_user.id, expenses=-expense["amount"])
+    await invalidate_public_cache(current_user.id)
+    await publish_change(current_user.id, "expense_deleted", {"id": expense_id})
     return {"message": "Expense deleted successfully"}
 
 # Dashboard route
 @api_router.get("/dashboard/summary", response_model=DashboardSummary)
 async def get_dashboard_summary(current_user: UserResponse = Depends(get_current_user)):
-    # Get all students for this tesorero
-    students = await db.students.find({"tesorero_id": current_user.id}).to_list(1000)
-    student_ids = [student["id"] for student in students]
-    
-    # Calculate total income from payments
-    payments = await db.payments.find({"student_id": {"$in": student_ids}, "paid": True}).to_list(1000)
-    total_income = sum(payment["amount"] for payment in payments)
-    
-    # Calculate total expenses
-    expenses = await db.expenses.find({"tesorero_id": current_user.id}).to_list(1000)
-    total_expenses = sum(expense["amount"] for expense in expenses)
+    return await build_dashboard_summary(current_user.id)
+
+async def build_dashboard_summary(tesorero_id: str, ledger: Optional[dict] = None) -> DashboardSummary:
+    ledger = ledger or await get_ledger(tesorero_id)
     
-    # Get payment settings to calculate pending payments
-    settings = await db.payment_settings.find_one({"tesorero_id": current_user.id})
+    # Pending payments are counted per student x selected month of the academic year
+    settings = await db.payment_settings.find_one(
+        {"tesorero_id": tesorero_id, **ACTIVE_SETTINGS}, {"_id": 0, "selected_months": 1, "academic_year": 1}
+    )
     pending_payments = 0
     if settings:
-        total_expected_payments = len(students) * len(settings["selected_months"])
-        actual_payments = len(payments)
-        pending_payments = max(0, total_expected_payments - actual_payments)
+        paid_counts = ledger["paid_counts"].get(settings["academic_year"], {})
+        pending_payments = sum(
+            max(0, ledger["student_count"] - paid_counts.get(month, 0)) for month in set(settings["selected_months"])
+        )
     
     return DashboardSummary(
-        total_income=total_income,
-        total_expenses=total_expenses,
-        current_balance=total_income - total_expenses,
-        total_students=len(students),
+        total_income=ledger["total_income"],
+        total_expenses=ledger["total_expenses"],
+        current_balance=ledger["total_income"] - ledger["total_expenses"],
+        total_students=ledger["student_count"],
         pending_payments=pending_payments
     )
 
+# Live update stream. EventSource cannot send headers, so the token comes in the query string
+def format_event(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+@api_router.get("/events")
+async def stream_events(token: str):
+    current_user = await user_for_token(token)
+    
+    async def events():
+        queue = event_bus.subscribe(current_user.id)
+        try:
+            # Clients start from the current totals, then receive deltas
+            summary = await build_dashboard_summary(current_user.id)
+            yield "retry: 5000\n" + format_event({"type": "totals", "data": jsonable_encoder(summary)})
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=EVENT_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment lines keep proxies from closing an idle stream
+                    yield ": heartbeat\n\n"
+                    continue
+                yield format_event(event)
+        finally:
+            event_bus.unsubscribe(current_user.id, queue)
+    
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def watch_ledger_changes():
+    # On a replica set every worker follows ledger writes from all workers, so totals
+    # reach clients whichever worker served the write
+    pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+    while True:
+        try:
+            async with db.ledger_totals.watch(pipeline, full_document="updateLookup") as stream:
+                async for change in stream:
+                    ledger = change.get("fullDocument")
+                    if not ledger or not event_bus.has_subscribers(ledger["tesorero_id"]):
+                        continue
+                    summary = await build_dashboard_summary(ledger["tesorero_id"], ledger)
+                    event_bus.publish(ledger["tesorero_id"], {"type": "totals", "data": jsonable_encoder(summary)})
+        except PyMongoError as e:
+            logger.error(f"Ledger change stream failed, retrying: {e}")
+            await asyncio.sleep(5)
+
+# Report routes: payment and expense ledgers are streamed from cursors in batches,
+# so exporting years of history never holds the whole report in memory
+REPORT_BATCH_SIZE = 500
+PAYMENT_REPORT_COLUMNS = ["Estudiante", "Cédula", "Año", "Mes", "Monto", "Fecha de pago"]
+EXPENSE_REPORT_COLUMNS = ["Fecha", "Descripción", "Responsable", "Monto"]
+REPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+def report_date_range(from_date: Optional[date], to_date: Optional[date]) -> dict:
+    # Both ends are inclusive days in UTC
+    date_range = {}
+    if from_date:
+        date_range["$gte"] = datetime.combine(from_date, datetime.min.time(), timezone.utc)
+    if to_date:
+        date_range["$lt"] = datetime.combine(to_date + timedelta(days=1), datetime.min.time(), timezone.utc)
+    return date_range
+
+async def payment_report_rows(tesorero_id: str, date_range: dict, student_names: dict):
+    # One document per student carrying its payments, in student order
+    conditions = [{"$eq": ["$$payment.paid", True]}]
+    for operator, value in date_range.items():
+        conditions.append({operator: ["$$payment.created_at", value]})
+    pipeline = [
+        {"$match": {"tesorero_id": tesorero_id, **ACTIVE_STUDENT}},
+        {"$sort": {"name": 1, "id": 1}},
+        {"$lookup": {"from": "payments", "localField": "id", "foreignField": "student_id", "as": "payments"}},
+        {"$lookup": {"from": ARCHIVE_COLLECTIONS["payments"], "localField": "id", "foreignField": "student_id", "as": "archived"}},
+        {"$project": {
+            "_id": 0, "id": 1, "name": 1, "cedula": 1,
+            "payments": {"$filter": {
+                "input": {"$concatArrays": ["$archived", "$payments"]}, "as": "payment", "cond": {"$and": conditions}
+            }}
+        }}
+    ]
+    total = 0
+    async for student in report_db.students.aggregate(pipeline, batchSize=REPORT_BATCH_SIZE):
+        student_names[student["id"]] = student["name"]
+        payments = sorted(student["payments"], key=lambda payment: (payment["year"], month_sort_key(payment["month"])))
+        for payment in payments:
+            payment = parse_from_mongo(payment)
+            total += payment["amount"]
+            yield [
+                student["name"], student["cedula"], payment["year"], payment["month"],
+                payment["amount"], payment["created_at"].date()
+            ]
+    yield ["Total", None, None, None, total, None]
+
+async def expense_report_rows(tesorero_id: str, date_range: dict, student_names: dict):
+    query = {"tesorero_id": tesorero_id}
+    if date_range:
+        query["created_at"] = date_range
+    projection = {"_id": 0, "description": 1, "amount": 1, "responsible_student_id": 1, "created_at": 1}
+    total = 0
+    # Closed years hold the older expenses, so the archive comes first
+    for collection in reversed(collection_with_archive("expenses", report_db)):
+        async for expense in collection.find(query, projection, batch_size=REPORT_BATCH_SIZE).sort(LIST_SORT):
+            expense = parse_from_mongo(expense)
+            total += expense["amount"]
+            yield [
+                expense["created_at"].date(), expense["description"],
+                student_names.get(expense["responsible_student_id"], "N/A"), expense["amount"]
+            ]
+    yield ["Total", None, None, total]
+
+def report_sections(tesorero_id: str, date_range: dict):
+    # The payment pass collects the student names the expense pass looks up
+    student_names = {}
+    return [
+        ("Pagos", PAYMENT_REPORT_COLUMNS, payment_report_rows(tesorero_id, date_range, student_names)),
+        ("Gastos", EXPENSE_REPORT_COLUMNS, expense_report_rows(tesorero_id, date_range, student_names)),
+    ]
+
+async def report_batches(rows):
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= REPORT_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+async def csv_report(tesorero_id: str, date_range: dict):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    
+    def flush() -> str:
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+    
+    # The byte order mark lets spreadsheet programs detect UTF-8
+    buffer.write("\ufeff")
+    for position, (title, columns, rows) in enumerate(report_sections(tesorero_id, date_range)):
+        if position:
+            writer.writerow([])
+        writer.writerow([title])
+        writer.writerow(columns)
+        async for batch in report_batches(rows):
+            writer.writerows(batch)
+            yield flush()
+    yield flush()
+
+def append_report_rows(sheet, batch: list):
+    for row in batch:
+        sheet.append(row)
+
+async def xlsx_report(tesorero_id: str, date_range: dict) -> Path:
+    # Write-only workbooks spool rows to disk; building them runs in worker threads
+    workbook = Workbook(write_only=True)
+    for title, columns, rows in report_sections(tesorero_id, date_range):
+        sheet = workbook.create_sheet(title)
+        sheet.append(columns)
+        async for batch in report_batches(rows):
+            await run_in_threadpool(append_report_rows, sheet, batch)
+    
+    handle, temp_name = tempfile.mkstemp(prefix="report_", suffix=".xlsx")
+    os.close(handle)
+    temp_path = Path(temp_name)
+    try:
+        await run_in_threadpool(workbook.save, temp_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return temp_path
+
+async def stream_file_once(path: Path):
+    # Streams a temporary file and removes it afterwards
+    try:
+        async with await anyio.open_file(path, "rb") as f:
+            while chunk := await f.read(IMAGE_CHUNK_SIZE):
+                yield chunk
+    finally:
+        path.unlink(missing_ok=True)
+
+@api_router.get("/reports/export")
+async def export_report(
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    date_range = report_date_range(from_date, to_date)
+    filename = f"reporte_{datetime.now(timezone.utc):%Y%m%d}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    
+    # Only CSV streams rows as they are read. An XLSX file is a zip archive whose parts are
+    # written when the workbook is saved, so nothing reaches the client until the whole
+    # report is built; large histories should be exported as CSV or narrowed with from/to
+    if format == "xlsx":
+        temp_path = await xlsx_report(current_user.id, date_range)
+        return StreamingResponse(stream_file_once(temp_path), media_type=REPORT_MEDIA_TYPES[format], headers=headers)
+    
+    return StreamingResponse(csv_report(current_user.id, date_range), media_type=REPORT_MEDIA_TYPES[format], headers=headers)
+
 # Public routes (no authentication required)
 @api_router.get("/public/student/{cedula}", response_model=Optional[PublicStudentInfo])
-async def get_public_student_info(cedula: str):
-    student = await db.students.find_one({"cedula": cedula})
+async def get_public_student_info(cedula: str, request: Request, year: Optional[str] = None):
+    return await cached_public_response(
+        request, f"student:{cedula}:{year or ''}", lambda: build_public_student_info(cedula, year)
+    )
+
+async def build_public_student_info(cedula: str, year: Optional[str] = None):
+    # A student created or deleted moments ago may not have reached the secondary yet
+    student = await public_db.students.find_one({"cedula": cedula, **ACTIVE_STUDENT})
+    if not student and any_recent_public_write():
+        student = await db.students.find_one({"cedula": cedula, **ACTIVE_STUDENT})
     if not student:
-        return None
+        return None, None
+    database = public_read_db(student["tesorero_id"])
+    if database is db:
+        student = await db.students.find_one({"cedula": cedula, **ACTIVE_STUDENT})
+        if not student:
+            return None, None
     
-    # Get payments for this student
-    payments = await db.payments.find({"student_id": student["id"], "paid": True}).to_list(1000)
+    # Get this student's payments for the academic year; years without settings are not
+    # cached, since any string can be asked for
+    payments, year_filter, known_year = await academic_year_scope("payments", "year", student["tesorero_id"], year, database)
+    payments = await payments.find({"student_id": student["id"], "paid": True, **year_filter}).to_list(1000)
     parsed_payments = [MonthlyPayment(**parse_from_mongo(payment)) for payment in payments]
     
     total_paid = sum(payment.amount for payment in parsed_payments)
@@ -412,71 +2328,127 @@ async def get_public_student_info(cedula: str):
         cedula=student["cedula"],
         payments=parsed_payments,
         total_paid=total_paid
-    )
+    ), student["tesorero_id"] if known_year else None
 
 @api_router.get("/public/paralelo/{tesorero_id}/summary")
-async def get_public_paralelo_summary(tesorero_id: str):
+async def get_public_paralelo_summary(tesorero_id: str, request: Request, year: Optional[str] = None):
+    return await cached_public_response(
+        request, f"paralelo:{tesorero_id}:{year or ''}", lambda: build_public_paralelo_summary(tesorero_id, year)
+    )
+
+async def build_public_paralelo_summary(tesorero_id: str, year: Optional[str] = None):
+    database = public_read_db(tesorero_id)
+    
     # Get tesorero info
-    tesorero = await db.users.find_one({"id": tesorero_id})
+    tesorero = await database.users.find_one({"id": tesorero_id}, {"_id": 0, "paralelo_name": 1})
     if not tesorero:
         raise HTTPException(status_code=404, detail="Paralelo not found")
     
-    # Get students for this paralelo
-    students = await db.students.find({"tesorero_id": tesorero_id}).to_list(1000)
-    student_ids = [student["id"] for student in students]
+    ledger = await get_ledger(tesorero_id, database)
     
-    # Calculate totals
-    payments = await db.payments.find({"student_id": {"$in": student_ids}, "paid": True}).to_list(1000)
-    total_income = sum(payment["amount"] for payment in payments)
+    # Totals span every year; the expense list covers one academic year
+    expenses, year_filter, known_year = await academic_year_scope("expenses", "academic_year", tesorero_id, year, database)
+    expenses = await expenses.find(
+        {"tesorero_id": tesorero_id, **year_filter},
+        {"_id": 0, "description": 1, "amount": 1, "responsible_student_id": 1, "activity_image": 1, "activity_thumbnail": 1, "created_at": 1}
+    ).to_list(None)
     
-    expenses = await db.expenses.find({"tesorero_id": tesorero_id}).to_list(1000)
-    total_expenses = sum(expense["amount"] for expense in expenses)
+    # Names of the responsible students, resolved with one query
+    responsible_ids = list({expense["responsible_student_id"] for expense in expenses})
+    students = await database.students.find(
+        {"id": {"$in": responsible_ids}, **ACTIVE_STUDENT}, {"_id": 0, "id": 1, "name": 1}
+    ).to_list(None)
+    student_names = {student["id"]: student["name"] for student in students}
     
     # Get expenses with student names
     expenses_with_details = []
     for expense in expenses:
-        student = await db.students.find_one({"id": expense["responsible_student_id"]})
         expense_detail = {
             "description": expense["description"],
             "amount": expense["amount"],
-            "responsible_student": student["name"] if student else "N/A",
+            "responsible_student": student_names.get(expense["responsible_student_id"], "N/A"),
             "activity_image": expense.get("activity_image"),
+            "activity_thumbnail": expense.get("activity_thumbnail"),
             "created_at": expense["created_at"]
         }
         expenses_with_details.append(expense_detail)
     
     return {
         "paralelo_name": tesorero["paralelo_name"],
-        "total_income": total_income,
-        "total_expenses": total_expenses,
-        "current_balance": total_income - total_expenses,
+        "total_income": ledger["total_income"],
+        "total_expenses": ledger["total_expenses"],
+        "current_balance": ledger["total_income"] - ledger["total_expenses"],
         "expenses": expenses_with_details
-    }
+    }, tesorero_id if known_year else None
 
-# Image upload route
+# Image routes
 @api_router.post("/upload-image")
 async def upload_image(file: UploadFile = File(...), current_user: UserResponse = Depends(get_current_user)):
-    if file.content_type not in ["image/jpeg", "image/png", "image/gif"]:
-        raise HTTPException(status_code=400, detail="Invalid file type")
+    # Streamed to the image store; the declared content type is not trusted
+    digest = await ingest_upload(file)
+    variants = await get_image_variants(digest)
     
-    # Read file content and encode to base64
-    content = await file.read()
-    encoded_content = base64.b64encode(content).decode('utf-8')
+    return {
+        "image_id": digest,
+        "image_url": f"/api/images/{digest}",
+        "thumbnail_url": f"/api/images/{variants['thumbnail']}",
+        "display_url": f"/api/images/{variants['display']}"
+    }
+
+@api_router.get("/images/{digest}")
+async def get_image(digest: str, request: Request):
+    if not IMAGE_DIGEST_PATTERN.match(digest):
+        raise HTTPException(status_code=404, detail="Image not found")
     
-    # Create data URL
-    data_url = f"data:{file.content_type};base64,{encoded_content}"
+    # Content never changes for a given digest, so the digest is a strong ETag
+    etag = f'"{digest}"'
+    cache_headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=cache_headers)
     
-    return {"image_url": data_url}
+    image = await image_store.get(digest)
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    return StreamingResponse(
+        image.chunks,
+        media_type=image.content_type,
+        headers={**cache_headers, "Content-Length": str(image.length)}
+    )
+
+# Metrics route
+def render_metrics() -> str:
+    lines = []
+    for histogram in (request_duration, stream_duration, request_mongo_commands, request_mongo_duration, response_size):
+        lines.extend(histogram.render())
+    caches = {"user": user_cache, "token": token_cache, "public": public_cache}
+    for metric, help_text in (("hits", "Cache hits"), ("misses", "Cache misses")):
+        lines.append(f"# HELP cache_{metric}_total {help_text}")
+        lines.append(f"# TYPE cache_{metric}_total counter")
+        for cache_name, cache in caches.items():
+            lines.append(f'cache_{metric}_total{{cache="{cache_name}"}} {cache.stats()[metric]}')
+    lines.append("# HELP cache_entries Entries currently cached")
+    lines.append("# TYPE cache_entries gauge")
+    for cache_name, cache in caches.items():
+        lines.append(f'cache_entries{{cache="{cache_name}"}} {cache.stats()["size"]}')
+    return "\n".join(lines) + "\n"
+
+@api_router.get("/_metrics")
+async def get_metrics():
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4")
 
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-After"],
 )
 
 # Configure logging
@@ -486,6 +2458,88 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Indexes the app relies on, declared per collection and ensured on startup
+COLLECTION_INDEXES = {
+    "users": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("username", ASCENDING)], unique=True),
+    ],
+    "students": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("tesorero_id", ASCENDING), ("cedula", ASCENDING)], unique=True),
+        IndexModel([("cedula", ASCENDING)]),
+        IndexModel([("tesorero_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("deleted_at", ASCENDING)], partialFilterExpression={"deleted_at": {"$exists": True}}),
+    ],
+    "payments": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("receipt_image", ASCENDING)], sparse=True),
+        IndexModel([("student_id", ASCENDING), ("month", ASCENDING), ("year", ASCENDING)], unique=True),
+        IndexModel([("student_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("student_id", ASCENDING), ("year", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),
+    ],
+    "expenses": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("responsible_student_id", ASCENDING)]),
+        IndexModel([("activity_image", ASCENDING)], sparse=True),
+        IndexModel([("tesorero_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("tesorero_id", ASCENDING), ("academic_year", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),
+    ],
+    "payments_archive": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("receipt_image", ASCENDING)], sparse=True),
+        IndexModel([("student_id", ASCENDING), ("year", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),
+    ],
+    "expenses_archive": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("responsible_student_id", ASCENDING)]),
+        IndexModel([("activity_image", ASCENDING)], sparse=True),
+        IndexModel([("tesorero_id", ASCENDING), ("academic_year", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),
+    ],
+    "payment_settings": [
+        IndexModel([("tesorero_id", ASCENDING), ("academic_year", ASCENDING)], unique=True),
+    ],
+    "ledger_totals": [
+        IndexModel([("tesorero_id", ASCENDING)], unique=True),
+    ],
+    "image_variants": [
+        IndexModel([("digest", ASCENDING)], unique=True),
+    ],
+}
+
+async def ensure_indexes():
+    for collection_name, indexes in COLLECTION_INDEXES.items():
+        collection = db[collection_name]
+        existing_indexes = await collection.index_information()
+        for index in indexes:
+            index_name = index.document["name"]
+            if index_name in existing_indexes:
+                continue
+            try:
+                await collection.create_indexes([index])
+                logger.info(f"Built index {collection_name}.{index_name}")
+            except OperationFailure as e:
+                # Existing duplicates must not keep the API from starting
+                logger.error(f"Could not build index {collection_name}.{index_name}: {e}")
+
+ledger_watcher = None
+
+@app.on_event("startup")
+async def startup_db_client():
+    global ledger_watcher
+    await ensure_indexes()
+    if EVENT_SOURCE == 'change_streams':
+        ledger_watcher = asyncio.create_task(watch_ledger_changes())
+    # Resume purges interrupted by a restart
+    schedule_student_purge()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    if ledger_watcher:
+        ledger_watcher.cancel()
+    if purge_retry:
+        purge_retry.cancel()
+    client.close()
+    if image_pool:
+        image_pool.shutdown()
+    password_pool.shutdown()
\ No newline at end of file
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for the Sistema de Aportes API.
+
+Boots backend/server.py in-process, seeds synthetic paralelos into a local
+MongoDB (MONGO_URL) or into mongomock-motor (--mock), drives concurrent
+scenarios and reports p50/p95/p99 latency and throughput. Results can be saved
+as a JSON baseline and later runs compared against it to catch regressions.
+
+    python backend_benchmark.py --mock --paralelos 3 --students 40
+    python backend_benchmark.py --save-baseline bench_baseline.json
+    python backend_benchmark.py --baseline bench_baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+SCENARIOS = ["dashboard", "payments_page", "payments_list", "public_student", "public_summary", "bulk_entry"]
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the Aportes API in-process")
+    parser.add_argument("--mock", action="store_true", help="Use mongomock-motor instead of MONGO_URL")
+    parser.add_argument("--db-name", default=f"aportes_bench_{uuid.uuid4().hex[:8]}", help="Database to seed (dropped afterwards)")
+    parser.add_argument("--paralelos", type=int, default=3)
+    parser.add_argument("--students", type=int, default=40, help="Students per paralelo")
+    parser.add_argument("--months", type=int, default=10, help="Paid months per student")
+    parser.add_argument("--years", type=int, default=1, help="Academic years of history")
+    parser.add_argument("--expenses", type=int, default=30, help="Expenses per paralelo")
+    parser.add_argument("--image-ratio", type=float, default=0.5, help="Share of payments with a receipt image")
+    parser.add_argument("--image-kb", type=int, default=200, help="Size of each synthetic receipt image")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma separated scenarios to run")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", help="Compare against this baseline JSON file")
+    parser.add_argument("--save-baseline", help="Write results to this baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 regression over baseline (0.2 = 20%%)")
+    return parser.parse_args()
+
+def load_server(args):
+    # Environment must be in place before server.py reads it at import time
+    os.environ["DB_NAME"] = args.db_name
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ["SLOW_REQUEST_MS"] = "600000"
+    if args.mock:
+        os.environ["IMAGE_STORE"] = "filesystem"
+        os.environ["IMAGE_STORE_PATH"] = tempfile.mkdtemp(prefix="aportes_bench_images_")
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+
+    if args.mock:
+        from mongomock_motor import AsyncMongoMockClient
+        server.client = AsyncMongoMockClient(tz_aware=True)
+        server.db = server.client[args.db_name]
+        server.public_db = server.report_db = server.db
+    return server
+
+class BenchmarkData:
+    def __init__(self):
+        self.tesoreros = []
+        self.cedulas = []
+        self.tokens = {}
+        self.students_by_tesorero = {}
+
+async def seed(server, args, rng: random.Random) -> BenchmarkData:
+    data = BenchmarkData()
+    db = server.db
+    months = server.MONTHS[:args.months]
+    current_year = datetime.now(timezone.utc).year
+    years = [str(current_year - offset) for offset in range(args.years)]
+    receipt = await server.store_image(PNG_HEADER + rng.randbytes(args.image_kb * 1024), "image/png")
+    created_at = datetime.now(timezone.utc) - timedelta(days=365 * args.years)
+
+    for paralelo in range(args.paralelos):
+        tesorero_id = str(uuid.uuid4())
+        await db.users.insert_one({
+            "id": tesorero_id,
+            "username": f"bench_tesorero_{paralelo}",
+            "password": server.hash_password("bench"),
+            "paralelo_name": f"Paralelo {paralelo + 1}",
+            "created_at": created_at
+        })
+        await db.payment_settings.insert_one({
+            "id": str(uuid.uuid4()),
+            "tesorero_id": tesorero_id,
+            "monthly_amount": 10.0,
+            "selected_months": months,
+            "academic_year": years[0],
+            "created_at": created_at
+        })
+
+        students = []
+        for number in range(args.students):
+            cedula = f"{paralelo:02d}{number:08d}"
+            students.append({
+                "id": str(uuid.uuid4()),
+                "name": f"Estudiante {paralelo}-{number}",
+                "cedula": cedula,
+                "tesorero_id": tesorero_id,
+                "created_at": created_at + timedelta(minutes=number)
+            })
+            data.cedulas.append(cedula)
+        await db.students.insert_many(students)
+
+        payments = []
+        for student in students:
+            for year in years:
+                for position, month in enumerate(months):
+                    payments.append({
+                        "id": str(uuid.uuid4()),
+                        "student_id": student["id"],
+                        "month": month,
+                        "year": year,
+                        "paid": True,
+                        "amount": 10.0,
+                        "receipt_image": receipt if rng.random() < args.image_ratio else None,
+                        "created_at": created_at + timedelta(days=30 * position)
+                    })
+        if payments:
+            await db.payments.insert_many(payments)
+
+        expenses = [{
+            "id": str(uuid.uuid4()),
+            "tesorero_id": tesorero_id,
+            "responsible_student_id": rng.choice(students)["id"],
+            "description": f"Actividad {number}",
+            "amount": round(rng.uniform(1, 50), 2),
+            "activity_image": receipt if rng.random() < args.image_ratio else None,
+            "created_at": created_at + timedelta(days=number)
+        } for number in range(args.expenses)]
+        if expenses:
+            await db.expenses.insert_many(expenses)
+
+        data.tesoreros.append(tesorero_id)
+        data.tokens[tesorero_id] = server.create_jwt_token(tesorero_id)
+        data.students_by_tesorero[tesorero_id] = [student["id"] for student in students]
+
+    await server.reconcile_ledgers()
+    return data
+
+def scenario_request(name: str, data: BenchmarkData, rng: random.Random):
+    tesorero_id = rng.choice(data.tesoreros)
+    headers = {"Authorization": f"Bearer {data.tokens[tesorero_id]}"}
+    if name == "dashboard":
+        return "GET", "/api/dashboard/summary", headers, None
+    if name == "payments_page":
+        return "GET", "/api/payments/matrix", headers, None
+    if name == "payments_list":
+        return "GET", "/api/payments", headers, None
+    if name == "public_student":
+        return "GET", f"/api/public/student/{rng.choice(data.cedulas)}", {}, None
+    if name == "public_summary":
+        return "GET", f"/api/public/paralelo/{tesorero_id}/summary", {}, None
+    if name == "bulk_entry":
+        month = rng.choice(["Noviembre", "Diciembre"])
+        body = [
+            {"student_id": student_id, "month": month, "year": "bench", "amount": 10.0}
+            for student_id in data.students_by_tesorero[tesorero_id]
+        ]
+        return "POST", "/api/payments/bulk", headers, body
+    raise ValueError(f"Unknown scenario: {name}")
+
+async def run_scenario(http, name: str, data: BenchmarkData, args, rng: random.Random) -> dict:
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for _ in range(args.requests):
+        queue.put_nowait(scenario_request(name, data, rng))
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            method, url, headers, body = queue.get_nowait()
+            started_at = time.perf_counter()
+            response = await http.request(method, url, headers=headers, json=body)
+            latencies.append(time.perf_counter() - started_at)
+            if response.status_code >= 400:
+                errors += 1
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started_at
+
+    cut_points = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(cut_points[49] * 1000, 2),
+        "p95_ms": round(cut_points[94] * 1000, 2),
+        "p99_ms": round(cut_points[98] * 1000, 2),
+    }
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        limit = previous["p95_ms"] * (1 + tolerance)
+        if result["p95_ms"] > limit:
+            regressions.append(f"{name}: p95 {result['p95_ms']}ms > {limit:.2f}ms (baseline {previous['p95_ms']}ms)")
+    return regressions
+
+async def run(args) -> int:
+    import httpx
+
+    rng = random.Random(args.seed)
+    server = load_server(args)
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+
+    print("🚀 Aportes API benchmark")
+    print(f"   Backend: {'mongomock-motor' if args.mock else os.environ['MONGO_URL']} / {args.db_name}")
+    print(f"   Data: {args.paralelos} paralelos x {args.students} students x {args.months} months x {args.years} years")
+    await server.ensure_indexes()
+    try:
+        data = await seed(server, args, rng)
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as http:
+            results = {}
+            for name in scenarios:
+                results[name] = await run_scenario(http, name, data, args, rng)
+                result = results[name]
+                print(f"   {name:<16} p50 {result['p50_ms']:>8}ms  p95 {result['p95_ms']:>8}ms  "
+                      f"p99 {result['p99_ms']:>8}ms  {result['throughput_rps']:>8} req/s  errors {result['errors']}")
+    finally:
+        await server.client.drop_database(args.db_name)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("baseline", "save_baseline", "db_name")},
+        "scenarios": results,
+    }
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(report, indent=2))
+        print(f"💾 Baseline written to {args.save_baseline}")
+
+    exit_code = 1 if any(result["errors"] for result in results.values()) else 0
+    if args.baseline:
+        regressions = compare_with_baseline(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        if regressions:
+            print("❌ Regressions against baseline:")
+            for regression in regressions:
+                print(f"   {regression}")
+            exit_code = 1
+        else:
+            print("✅ No regressions against baseline")
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
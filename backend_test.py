@@ -1,6 +1,7 @@
 import requests
 import sys
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 class AportesAPITester:
@@ -142,7 +143,29 @@ class AportesAPITester:
         )
         return success
 
-    def test_create_payment(self, student_id, month="Enero", year="2025", amount=15.0):
+    def test_academic_years(self):
+        """List academic years and check the active one cannot be closed"""
+        success, response = self.run_test(
+            "Get academic years",
+            "GET",
+            "academic-years",
+            200
+        )
+        if not success:
+            return False
+        active = [year for year in response if year.get("active")]
+        print(f"   Found {len(response)} academic years")
+        if not active:
+            return True
+        success, _ = self.run_test(
+            f"Reject closing active year {active[0]['academic_year']}",
+            "POST",
+            f"academic-years/{active[0]['academic_year']}/close",
+            400
+        )
+        return success
+
+    def test_create_payment(self, student_id, month="Enero", year="2025", amount=15.0, receipt_image=None):
         """Create a payment for a student"""
         success, response = self.run_test(
             f"Create payment for student {student_id}",
@@ -153,7 +176,8 @@ class AportesAPITester:
                 "student_id": student_id,
                 "month": month,
                 "year": year,
-                "amount": amount
+                "amount": amount,
+                "receipt_image": receipt_image
             }
         )
         if success and 'id' in response:
@@ -161,6 +185,60 @@ class AportesAPITester:
             return response['id']
         return None
 
+    def test_bulk_payments(self, student_ids, month="Marzo", year="2025", amount=15.0):
+        """Record one month for several students in a single request"""
+        success, response = self.run_test(
+            f"Bulk payments for {len(student_ids)} students",
+            "POST",
+            "payments/bulk",
+            200,
+            data=[
+                {"student_id": student_id, "month": month, "year": year, "amount": amount}
+                for student_id in student_ids
+            ]
+        )
+        if not success:
+            return False
+        for result in response:
+            if result.get("status") == "error":
+                print(f"   Item {result.get('index')} failed: {result.get('detail')}")
+                return False
+            self.payment_ids.append(result["payment"]["id"])
+        print(f"   Recorded {len(response)} payments")
+        return True
+
+    def test_concurrent_bulk_ledger(self, student_ids, month="Abril", year="2025", amount=15.0):
+        """Two concurrent bulk requests for the same rows must count each row once in the ledger"""
+        self.tests_run += 1
+        print(f"\n🔍 Testing Concurrent bulk payments keep ledger totals...")
+        headers = {"Authorization": f"Bearer {self.token}"}
+        body = [{"student_id": student_id, "month": month, "year": year, "amount": amount} for student_id in student_ids]
+        try:
+            before = requests.get(f"{self.base_url}/dashboard/summary", headers=headers).json()
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                responses = list(pool.map(
+                    lambda _: requests.post(f"{self.base_url}/payments/bulk", json=body, headers=headers), range(2)
+                ))
+            if any(response.status_code != 200 for response in responses):
+                print(f"❌ Failed - Bulk requests returned {[response.status_code for response in responses]}")
+                return False
+            for response in responses:
+                for result in response.json():
+                    if result.get("payment"):
+                        self.payment_ids.append(result["payment"]["id"])
+            after = requests.get(f"{self.base_url}/dashboard/summary", headers=headers).json()
+            expected = before["total_income"] + amount * len(student_ids)
+            if abs(after["total_income"] - expected) > 0.005:
+                print(f"❌ Failed - Income is {after['total_income']}, expected {expected}")
+                return False
+            self.payment_ids = list(dict.fromkeys(self.payment_ids))
+            self.tests_passed += 1
+            print(f"✅ Passed - Income {before['total_income']} -> {after['total_income']}")
+            return True
+        except Exception as e:
+            print(f"❌ Failed - Error: {str(e)}")
+            return False
+
     def test_get_payments(self):
         """Get all payments"""
         success, response = self.run_test(
@@ -233,6 +311,59 @@ class AportesAPITester:
             print(f"   Payments: {len(response.get('payments', []))}")
         return success
 
+    def test_upload_image(self):
+        """Upload a receipt image and fetch it back from the image store"""
+        self.tests_run += 1
+        print(f"\n🔍 Testing Upload image...")
+        png = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+        try:
+            response = requests.post(
+                f"{self.base_url}/upload-image",
+                files={"file": ("receipt.png", png, "image/png")},
+                headers={"Authorization": f"Bearer {self.token}"}
+            )
+            if response.status_code != 200:
+                print(f"❌ Failed - Expected 200, got {response.status_code}")
+                return None
+            image_id = response.json()["image_id"]
+            image = requests.get(f"{self.base_url}/images/{image_id}")
+            if image.status_code != 200 or image.content != png:
+                print(f"❌ Failed - Image could not be read back")
+                return None
+            cached = requests.get(f"{self.base_url}/images/{image_id}", headers={"If-None-Match": image.headers.get("ETag", "")})
+            if cached.status_code != 304:
+                print(f"❌ Failed - Expected 304 for cached image, got {cached.status_code}")
+                return None
+            self.tests_passed += 1
+            print(f"✅ Passed - Image id: {image_id}")
+            return image_id
+        except Exception as e:
+            print(f"❌ Failed - Error: {str(e)}")
+            return None
+
+    def test_export_report(self, format="csv"):
+        """Download the payment and expense report"""
+        self.tests_run += 1
+        print(f"\n🔍 Testing Export report ({format})...")
+        try:
+            response = requests.get(
+                f"{self.base_url}/reports/export",
+                params={"format": format},
+                headers={"Authorization": f"Bearer {self.token}"}
+            )
+            if response.status_code != 200:
+                print(f"❌ Failed - Expected 200, got {response.status_code}")
+                return False
+            if format == "csv" and "Pagos" not in response.text:
+                print(f"❌ Failed - Report has no payments section")
+                return False
+            self.tests_passed += 1
+            print(f"✅ Passed - {len(response.content)} bytes")
+            return True
+        except Exception as e:
+            print(f"❌ Failed - Error: {str(e)}")
+            return False
+
     def test_delete_operations(self):
         """Test delete operations"""
         success_count = 0
@@ -292,6 +423,10 @@ def main():
         print("❌ Payment settings failed")
         return 1
     
+    if not tester.test_academic_years():
+        print("❌ Academic years failed")
+        return 1
+    
     # Test student management
     student1_id = tester.test_create_student("Juan Pérez", "1234567890")
     student2_id = tester.test_create_student("María González", "0987654321")
@@ -304,14 +439,28 @@ def main():
         print("❌ Get students failed")
         return 1
     
+    # Test image upload
+    image_id = tester.test_upload_image()
+    if not image_id:
+        print("❌ Image upload failed")
+        return 1
+    
     # Test payments
-    payment1_id = tester.test_create_payment(student1_id, "Enero", "2025", 15.0)
+    payment1_id = tester.test_create_payment(student1_id, "Enero", "2025", 15.0, receipt_image=image_id)
     payment2_id = tester.test_create_payment(student2_id, "Febrero", "2025", 15.0)
     
     if not payment1_id or not payment2_id:
         print("❌ Payment creation failed")
         return 1
     
+    if not tester.test_bulk_payments([student1_id, student2_id]):
+        print("❌ Bulk payments failed")
+        return 1
+    
+    if not tester.test_concurrent_bulk_ledger([student1_id, student2_id]):
+        print("❌ Concurrent bulk ledger check failed")
+        return 1
+    
     if not tester.test_get_payments():
         print("❌ Get payments failed")
         return 1
@@ -333,6 +482,12 @@ def main():
         print("❌ Dashboard summary failed")
         return 1
     
+    # Test report export
+    for format in ("csv", "xlsx"):
+        if not tester.test_export_report(format):
+            print(f"❌ Export report ({format}) failed")
+            return 1
+    
     # Test public endpoints
     if not tester.test_public_student_info("1234567890"):
         print("❌ Public student info failed")
@@ -3,9 +3,10 @@ import { Link } from 'react-router-dom';
 import axios from 'axios';
 import { 
   DollarSign, TrendingUp, TrendingDown, Users, 
-  AlertCircle, Eye, Share2, Copy, Settings 
+  AlertCircle, Eye, Share2, Copy, Settings, Download 
 } from 'lucide-react';
 import { toast } from 'sonner';
+import { useLiveEvents } from '../hooks/use-live-events';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -18,6 +19,11 @@ const Dashboard = () => {
     fetchSummary();
   }, []);
 
+  // Totals pushed after every write replace the summary without refetching
+  useLiveEvents({
+    totals: setSummary
+  });
+
   const fetchSummary = async () => {
     try {
       const response = await axios.get(`${API}/dashboard/summary`);
@@ -40,6 +46,24 @@ const Dashboard = () => {
     });
   };
 
+  const exportReport = async (format) => {
+    try {
+      // Authenticated download, so the file comes through axios rather than a plain link
+      const response = await axios.get(`${API}/reports/export`, {
+        params: { format },
+        responseType: 'blob'
+      });
+      const url = window.URL.createObjectURL(response.data);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = `reporte.${format}`;
+      link.click();
+      window.URL.revokeObjectURL(url);
+    } catch (error) {
+      toast.error('Error al exportar el reporte');
+    }
+  };
+
   if (loading) {
     return (
       <div className="min-h-screen flex items-center justify-center">
@@ -196,6 +220,20 @@ const Dashboard = () => {
                 <Share2 className="h-4 w-4 mr-2" />
                 Compartir Link Público
               </button>
+              <button
+                onClick={() => exportReport('xlsx')}
+                className="btn btn-outline w-full justify-start"
+              >
+                <Download className="h-4 w-4 mr-2" />
+                Exportar Reporte (Excel)
+              </button>
+              <button
+                onClick={() => exportReport('csv')}
+                className="btn btn-outline w-full justify-start"
+              >
+                <Download className="h-4 w-4 mr-2" />
+                Exportar Reporte (CSV)
+              </button>
             </div>
           </div>
 
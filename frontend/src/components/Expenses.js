@@ -9,6 +9,9 @@ import { toast } from 'sonner';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Images are stored by content digest; older records may still hold data URLs
+const imageUrl = (image) => image.startsWith('data:') ? image : `${API}/images/${image}`;
+
 const Expenses = () => {
   const [expenses, setExpenses] = useState([]);
   const [students, setStudents] = useState([]);
@@ -62,8 +65,8 @@ const Expenses = () => {
         headers: { 'Content-Type': 'multipart/form-data' }
       });
 
-      setFormData(prev => ({ ...prev, activity_image: response.data.image_url }));
-      setImagePreview(response.data.image_url);
+      setFormData(prev => ({ ...prev, activity_image: response.data.image_id }));
+      setImagePreview(`${BACKEND_URL}${response.data.thumbnail_url}`);
       toast.success('Imagen cargada exitosamente');
     } catch (error) {
       toast.error('Error al cargar la imagen');
@@ -89,6 +92,18 @@ const Expenses = () => {
     }
   };
 
+  const openActivityImage = async (expense) => {
+    // List responses only flag images; the reference is fetched on demand
+    const imageWindow = window.open('', '_blank');
+    try {
+      const response = await axios.get(`${API}/expenses/${expense.id}/activity-image`);
+      imageWindow.location.href = imageUrl(response.data.activity_display || response.data.activity_image);
+    } catch (error) {
+      imageWindow.close();
+      toast.error('Error al cargar la imagen');
+    }
+  };
+
   const handleDelete = async () => {
     try {
       await axios.delete(`${API}/expenses/${selectedExpense.id}`);
@@ -221,12 +236,21 @@ const Expenses = () => {
                           ${expense.amount.toFixed(2)}
                         </td>
                         <td>
-                          {expense.activity_image ? (
+                          {expense.has_activity_image ? (
                             <button
-                              onClick={() => window.open(expense.activity_image, '_blank')}
+                              onClick={() => openActivityImage(expense)}
                               className="text-blue-600 hover:text-blue-800"
                             >
-                              <Upload className="h-4 w-4" />
+                              {expense.activity_thumbnail ? (
+                                <img
+                                  src={imageUrl(expense.activity_thumbnail)}
+                                  alt="Miniatura"
+                                  loading="lazy"
+                                  className="h-10 w-10 rounded object-cover"
+                                />
+                              ) : (
+                                <Upload className="h-4 w-4" />
+                              )}
                             </button>
                           ) : (
                             <span className="text-gray-400">-</span>
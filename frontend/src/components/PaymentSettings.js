@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
-import { Settings, DollarSign, Calendar, Save, Check } from 'lucide-react';
+import { Settings, DollarSign, Calendar, Save, Check, Archive } from 'lucide-react';
 import { toast } from 'sonner';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -8,6 +8,7 @@ const API = `${BACKEND_URL}/api`;
 
 const PaymentSettings = () => {
   const [settings, setSettings] = useState(null);
+  const [years, setYears] = useState([]);
   const [loading, setLoading] = useState(true);
   const [saving, setSaving] = useState(false);
   const [formData, setFormData] = useState({
@@ -23,8 +24,31 @@ const PaymentSettings = () => {
 
   useEffect(() => {
     fetchSettings();
+    fetchYears();
   }, []);
 
+  const fetchYears = async () => {
+    try {
+      const response = await axios.get(`${API}/academic-years`);
+      setYears(response.data);
+    } catch (error) {
+      toast.error('Error al cargar los años lectivos');
+    }
+  };
+
+  const closeYear = async (year) => {
+    if (!window.confirm(`¿Cerrar el año lectivo ${year}? Sus pagos y gastos pasarán al archivo y no podrán modificarse.`)) {
+      return;
+    }
+    try {
+      const response = await axios.post(`${API}/academic-years/${year}/close`);
+      toast.success(`Año ${year} cerrado: ${response.data.payments_archived} pagos y ${response.data.expenses_archived} gastos archivados`);
+      fetchYears();
+    } catch (error) {
+      toast.error(error.response?.data?.detail || 'Error al cerrar el año lectivo');
+    }
+  };
+
   const fetchSettings = async () => {
     try {
       const response = await axios.get(`${API}/payment-settings`);
@@ -60,6 +84,7 @@ const PaymentSettings = () => {
       });
       
       setSettings(response.data);
+      fetchYears();
       toast.success('Configuración guardada exitosamente');
     } catch (error) {
       toast.error('Error al guardar configuración');
@@ -302,6 +327,37 @@ const PaymentSettings = () => {
             </div>
           </div>
         )}
+
+        {/* Academic Years */}
+        {years.length > 1 && (
+          <div className="card mt-6">
+            <div className="card-header">
+              <h3 className="card-title">Años Lectivos</h3>
+              <p className="card-description">Los años cerrados se consultan desde el archivo</p>
+            </div>
+            <div className="card-content space-y-3">
+              {years.map((year) => (
+                <div key={year.academic_year} className="flex items-center justify-between">
+                  <span className="font-medium">{year.academic_year}</span>
+                  {year.active ? (
+                    <span className="text-sm text-green-600">Activo</span>
+                  ) : year.closed_at ? (
+                    <span className="text-sm text-gray-500">Cerrado</span>
+                  ) : (
+                    <button
+                      type="button"
+                      onClick={() => closeYear(year.academic_year)}
+                      className="btn btn-outline"
+                    >
+                      <Archive className="h-4 w-4 mr-2" />
+                      Cerrar Año
+                    </button>
+                  )}
+                </div>
+              ))}
+            </div>
+          </div>
+        )}
       </div>
     </div>
   );
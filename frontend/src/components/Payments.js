@@ -5,14 +5,19 @@ import {
   AlertCircle, DollarSign, Calendar, User, Trash2
 } from 'lucide-react';
 import { toast } from 'sonner';
+import { useLiveEvents } from '../hooks/use-live-events';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Images are stored by content digest; older records may still hold data URLs
+const imageUrl = (image) => image.startsWith('data:') ? image : `${API}/images/${image}`;
+
 const Payments = () => {
   const [students, setStudents] = useState([]);
   const [payments, setPayments] = useState([]);
   const [settings, setSettings] = useState(null);
+  const [matrixYear, setMatrixYear] = useState(null);
   const [loading, setLoading] = useState(true);
   const [showPaymentModal, setShowPaymentModal] = useState(false);
   const [showDeleteModal, setShowDeleteModal] = useState(false);
@@ -36,24 +41,67 @@ const Payments = () => {
     fetchData();
   }, []);
 
+  // Payments recorded or deleted elsewhere are applied in place; other changes reload the grid
+  const applyPayments = (recorded) => {
+    const rows = recorded
+      .filter(payment => payment.year === matrixYear)
+      .map(payment => ({
+        id: payment.id,
+        student_id: payment.student_id,
+        month: payment.month,
+        year: payment.year,
+        amount: payment.amount,
+        has_receipt_image: Boolean(payment.receipt_image),
+        receipt_thumbnail: payment.receipt_thumbnail,
+        created_at: payment.created_at
+      }));
+    setPayments(prev => [
+      ...prev.filter(payment => !rows.some(row => row.student_id === payment.student_id && row.month === payment.month)),
+      ...rows
+    ]);
+  };
+
+  useLiveEvents({
+    payment_recorded: (payment) => applyPayments([payment]),
+    payments_recorded: applyPayments,
+    payment_deleted: (deleted) => setPayments(prev => prev.filter(payment => payment.id !== deleted.id)),
+    student_added: () => fetchData(),
+    students_imported: () => fetchData(),
+    student_deleted: () => fetchData(),
+    settings_updated: () => fetchData(),
+    year_closed: () => fetchData(),
+    resync: () => fetchData()
+  });
+
   const fetchData = async () => {
     try {
-      const [studentsRes, paymentsRes, settingsRes] = await Promise.all([
-        axios.get(`${API}/students`),
-        axios.get(`${API}/payments`),
-        axios.get(`${API}/payment-settings`)
-      ]);
+      // One request returns settings plus the student x month grid for the academic year
+      const { data: matrix } = await axios.get(`${API}/payments/matrix`);
 
-      setStudents(studentsRes.data);
-      setPayments(paymentsRes.data);
-      setSettings(settingsRes.data);
+      setStudents(matrix.rows.map(row => row.student));
+      setPayments(matrix.rows.flatMap(row =>
+        row.cells
+          .filter(cell => cell.paid)
+          .map(cell => ({
+            id: cell.payment_id,
+            student_id: row.student.id,
+            month: cell.month,
+            year: matrix.year,
+            amount: cell.amount,
+            has_receipt_image: cell.has_receipt_image,
+            receipt_thumbnail: cell.receipt_thumbnail,
+            created_at: cell.created_at
+          }))
+      ));
+      setSettings(matrix.settings);
+      setMatrixYear(matrix.year);
 
       // Set default amount from settings
-      if (settingsRes.data && !formData.amount) {
+      if (matrix.settings && !formData.amount) {
         setFormData(prev => ({
           ...prev,
-          amount: settingsRes.data.monthly_amount.toString(),
-          year: settingsRes.data.academic_year
+          amount: matrix.settings.monthly_amount.toString(),
+          year: matrix.settings.academic_year
         }));
       }
     } catch (error) {
@@ -80,8 +128,8 @@ const Payments = () => {
         headers: { 'Content-Type': 'multipart/form-data' }
       });
 
-      setFormData(prev => ({ ...prev, receipt_image: response.data.image_url }));
-      setImagePreview(response.data.image_url);
+      setFormData(prev => ({ ...prev, receipt_image: response.data.image_id }));
+      setImagePreview(`${BACKEND_URL}${response.data.thumbnail_url}`);
       toast.success('Imagen cargada exitosamente');
     } catch (error) {
       toast.error('Error al cargar la imagen');
@@ -108,6 +156,18 @@ const Payments = () => {
     }
   };
 
+  const openReceipt = async (payment) => {
+    // List responses only flag images; the reference is fetched on demand
+    const imageWindow = window.open('', '_blank');
+    try {
+      const response = await axios.get(`${API}/payments/${payment.id}/receipt-image`);
+      imageWindow.location.href = imageUrl(response.data.receipt_display || response.data.receipt_image);
+    } catch (error) {
+      imageWindow.close();
+      toast.error('Error al cargar la imagen');
+    }
+  };
+
   const handleDelete = async () => {
     try {
       await axios.delete(`${API}/payments/${selectedPayment.id}`);
@@ -272,12 +332,21 @@ const Payments = () => {
                           ${payment.amount.toFixed(2)}
                         </td>
                         <td>
-                          {payment.receipt_image ? (
+                          {payment.has_receipt_image ? (
                             <button
-                              onClick={() => window.open(payment.receipt_image, '_blank')}
+                              onClick={() => openReceipt(payment)}
                               className="text-blue-600 hover:text-blue-800"
                             >
-                              <Upload className="h-4 w-4" />
+                              {payment.receipt_thumbnail ? (
+                                <img
+                                  src={imageUrl(payment.receipt_thumbnail)}
+                                  alt="Miniatura"
+                                  loading="lazy"
+                                  className="h-10 w-10 rounded object-cover"
+                                />
+                              ) : (
+                                <Upload className="h-4 w-4" />
+                              )}
                             </button>
                           ) : (
                             <span className="text-gray-400">-</span>
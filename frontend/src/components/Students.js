@@ -2,7 +2,7 @@ import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import { 
   Plus, Users, Search, Trash2, 
-  UserPlus, AlertTriangle 
+  UserPlus, AlertTriangle, Upload 
 } from 'lucide-react';
 import { toast } from 'sonner';
 
@@ -49,6 +49,31 @@ const Students = () => {
     }
   };
 
+  const handleImport = async (e) => {
+    const file = e.target.files[0];
+    e.target.value = '';
+    if (!file) return;
+
+    try {
+      const formDataUpload = new FormData();
+      formDataUpload.append('file', file);
+
+      const response = await axios.post(`${API}/students/import`, formDataUpload, {
+        headers: { 'Content-Type': 'multipart/form-data' }
+      });
+
+      const { imported, rejected } = response.data;
+      toast.success(`${imported} estudiantes importados`);
+      if (rejected.length > 0) {
+        toast.error(`${rejected.length} filas rechazadas: ` +
+          rejected.slice(0, 5).map(r => `fila ${r.row} (${r.reason})`).join(', '));
+      }
+      fetchStudents();
+    } catch (error) {
+      toast.error(error.response?.data?.detail || 'Error al importar estudiantes');
+    }
+  };
+
   const handleDelete = async () => {
     try {
       await axios.delete(`${API}/students/${selectedStudent.id}`);
@@ -95,13 +120,25 @@ const Students = () => {
               Administra los estudiantes del paralelo
             </p>
           </div>
-          <button
-            onClick={() => setShowAddModal(true)}
-            className="btn btn-primary"
-          >
-            <Plus className="h-4 w-4 mr-2" />
-            Agregar Estudiante
-          </button>
+          <div className="flex space-x-3">
+            <label className="btn btn-secondary cursor-pointer">
+              <Upload className="h-4 w-4 mr-2" />
+              Importar CSV/Excel
+              <input
+                type="file"
+                accept=".csv,.xlsx"
+                onChange={handleImport}
+                className="hidden"
+              />
+            </label>
+            <button
+              onClick={() => setShowAddModal(true)}
+              className="btn btn-primary"
+            >
+              <Plus className="h-4 w-4 mr-2" />
+              Agregar Estudiante
+            </button>
+          </div>
         </div>
 
         {/* Search and Stats */}
@@ -0,0 +1,36 @@
+import { useEffect, useRef } from 'react';
+
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+
+const EVENT_TYPES = [
+  'totals', 'resync', 'settings_updated',
+  'student_added', 'students_imported', 'student_deleted',
+  'payment_recorded', 'payments_recorded', 'payment_deleted',
+  'expense_added', 'expense_deleted', 'year_closed'
+];
+
+// Subscribes to the tesorero's live update stream; handlers are keyed by event type
+export function useLiveEvents(handlers) {
+  const handlersRef = useRef(handlers);
+  handlersRef.current = handlers;
+
+  useEffect(() => {
+    const token = localStorage.getItem('token');
+    if (!token) {
+      return undefined;
+    }
+
+    // EventSource cannot send headers, so the token goes in the query string
+    const source = new EventSource(`${API}/events?token=${encodeURIComponent(token)}`);
+    EVENT_TYPES.forEach((type) => {
+      source.addEventListener(type, (event) => {
+        const handler = handlersRef.current[type];
+        if (handler) {
+          handler(JSON.parse(event.data));
+        }
+      });
+    });
+    return () => source.close();
+  }, []);
+}
@@ -30,7 +30,7 @@ async def create_test_user():
         "username": "tesorero1",
         "password": hash_password("password123"),
         "paralelo_name": "8vo Año A",
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     }
     
     # Check if user already exists